@@ -0,0 +1,499 @@
+"""Poll cycle and write latency benchmark against the simulated unit.
+
+Runs the integration's real coordinator, bus and climate entity against
+bench.simulator and reports, per scenario, the Modbus transactions per
+cycle, wall time per cycle and bytes on the wire. Bytes are counted as
+the equivalent RTU frames (address, PDU and CRC) so the numbers compare
+with a serial installation even though the simulator is reached over
+loopback TCP. Further scenarios measure setter latency while the
+coordinator polls continuously, the wall time of a full cycle of
+several units sharing one line compared to each unit on its own port,
+a full cycle over a delayed TCP link with requests sent one at a time
+compared to pipelined, the bus transactions caused by consumers
+polling the unit through the Modbus TCP proxy, and the transactions of a
+simulated hour in several operating states with fixed and adaptive
+polling, alarm fast path included.
+
+    python -m bench.poll_cycle --latency 20 --cycles 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import types
+
+from homeassistant.const import ATTR_TEMPERATURE
+from homeassistant.core import HomeAssistant
+from pymodbus.client import AsyncModbusTcpClient
+
+from custom_components.nilan.bus import NilanBus
+from custom_components.nilan.climate import NilanClimateEntity
+from custom_components.nilan.const import (
+    DEFAULT_ALARM_INTERVAL,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_MODEL,
+    DEFAULT_NORMAL_INTERVAL,
+    DEFAULT_SLOW_INTERVAL,
+    GROUP_FAST,
+    GROUP_NORMAL,
+    GROUP_SLOW,
+    GROUPS,
+    INPUT,
+)
+from custom_components.nilan.coordinator import NilanCoordinator
+from custom_components.nilan.proxy import NilanProxy, RegisterImage
+from custom_components.nilan.registers import RegisterMap
+
+from .simulator import DEFAULT_SLAVE, NetworkLink, NilanSimulator
+
+INTERVALS = {
+    GROUP_FAST: DEFAULT_FAST_INTERVAL,
+    GROUP_NORMAL: DEFAULT_NORMAL_INTERVAL,
+    GROUP_SLOW: DEFAULT_SLOW_INTERVAL,
+}
+
+
+class MeteredClient:
+    """Pymodbus client wrapper counting transactions and RTU frame bytes."""
+
+    def __init__(self, client):
+        """Initialize the wrapper."""
+        self.client = client
+        self.comm_params = client.comm_params
+        self.transactions = 0
+        self.bytes = 0
+
+    @property
+    def connected(self):
+        """Return True while the wrapped client is connected."""
+        return self.client.connected
+
+    async def connect(self):
+        """Connect the wrapped client."""
+        return await self.client.connect()
+
+    def close(self):
+        """Close the wrapped client."""
+        self.client.close()
+
+    def reset(self):
+        """Reset the counters."""
+        self.transactions = 0
+        self.bytes = 0
+
+    def _count(self, request_bytes, result, response_bytes):
+        """Account for one request/response pair."""
+        self.transactions += 1
+        self.bytes += request_bytes + (5 if result.isError() else response_bytes)
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        result = await self.client.read_input_registers(address, count=count, slave=slave)
+        self._count(8, result, 5 + 2 * count)
+        return result
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        result = await self.client.read_holding_registers(address, count=count, slave=slave)
+        self._count(8, result, 5 + 2 * count)
+        return result
+
+    async def write_registers(self, address, values, slave=0):
+        """Write holding registers."""
+        result = await self.client.write_registers(address, values, slave=slave)
+        self._count(9 + 2 * len(values), result, 8)
+        return result
+
+    async def readwrite_registers(self, read_address, read_count, write_address, values, slave=0):
+        """Write holding registers and read registers back in one transaction."""
+        result = await self.client.readwrite_registers(read_address, read_count, write_address, values, slave=slave)
+        self._count(13 + 2 * len(values), result, 5 + 2 * read_count)
+        return result
+
+
+async def _refresh(coordinator, groups):
+    """Run one coordinator cycle reading exactly the given groups."""
+    now = time.monotonic()
+    for group in GROUPS:
+        if group in groups:
+            coordinator._last_read.pop(group, None)
+        else:
+            coordinator._last_read[group] = now
+    await coordinator.async_refresh()
+
+
+async def _measure_cycles(metered, coordinator, climate, groups, cycles):
+    """Measure transactions, wall time and bytes per cycle."""
+    # Warm up with a full cycle so partial scenarios start from a complete snapshot
+    await _refresh(coordinator, GROUPS)
+    durations = []
+    metered.reset()
+    for _ in range(cycles):
+        start = time.perf_counter()
+        await _refresh(coordinator, groups)
+        climate._apply_snapshot(coordinator.data)
+        durations.append(time.perf_counter() - start)
+    return {
+        "transactions_per_cycle": metered.transactions / cycles,
+        "bytes_per_cycle": metered.bytes / cycles,
+        "wall_time_per_cycle": statistics.mean(durations),
+    }
+
+
+async def _measure_setters(metered, climate):
+    """Measure the transactions and latency of each setter."""
+    setters = {
+        "set_temperature": lambda: climate.async_set_temperature(**{ATTR_TEMPERATURE: 21.5}),
+        "set_fan_mode": lambda: climate.async_set_fan_mode("normal-high"),
+        "set_hvac_mode": lambda: climate.async_set_hvac_mode("heat"),
+        "set_air_exchange_mode": lambda: climate.async_set_air_exchange_mode("Comfort"),
+        "set_hotwater_setpoints": lambda: climate.async_set_hotwater_setpoints(55.0, 45.0),
+    }
+    results = {}
+    for name, setter in setters.items():
+        metered.reset()
+        start = time.perf_counter()
+        await setter()
+        results[name] = {
+            "transactions": metered.transactions,
+            "bytes": metered.bytes,
+            "latency": time.perf_counter() - start,
+        }
+    return results
+
+
+async def _measure_write_latency(coordinator, climate, writes):
+    """Measure set_temperature latency while polling runs continuously."""
+    polling = True
+
+    async def poll():
+        while polling:
+            await _refresh(coordinator, GROUPS)
+
+    poller = asyncio.create_task(poll())
+    latencies = []
+    try:
+        for index in range(writes):
+            await asyncio.sleep(0.05 + 0.01 * (index % 5))
+            start = time.perf_counter()
+            await climate.async_set_temperature(**{ATTR_TEMPERATURE: 20 + index % 3})
+            latencies.append(time.perf_counter() - start)
+    finally:
+        polling = False
+        await poller
+    latencies.sort()
+    return {
+        "writes": writes,
+        "mean": statistics.mean(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "max": latencies[-1],
+        "bus": coordinator.client.stats(),
+    }
+
+
+async def _measure_concurrent(coordinators, cycles):
+    """Measure the wall time of full cycles of several units polled together."""
+    await asyncio.gather(*(_refresh(coordinator, GROUPS) for coordinator in coordinators))
+    durations = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        await asyncio.gather(*(_refresh(coordinator, GROUPS) for coordinator in coordinators))
+        durations.append(time.perf_counter() - start)
+    return statistics.mean(durations)
+
+
+async def _measure_units(hass, args):
+    """Compare several units on one shared line with one port per unit."""
+    latency = args.latency / 1000
+    results = {}
+    for units in range(1, args.units + 1):
+        row = {}
+        # Every unit on one line, polled through one client and bus
+        with NilanSimulator(args.port + 1, latency, DEFAULT_SLAVE, units=units) as simulator:
+            client = AsyncModbusTcpClient("127.0.0.1", port=simulator.port)
+            await client.connect()
+            try:
+                bus = NilanBus(client)
+                coordinators = [_build(hass, bus, RegisterMap(DEFAULT_MODEL), slave)[0] for slave in simulator.slaves]
+                row["shared_line"] = await _measure_concurrent(coordinators, args.cycles)
+            finally:
+                client.close()
+        # One line per unit, each with its own client and bus
+        simulators = [NilanSimulator(args.port + 2 + index, latency, DEFAULT_SLAVE).start() for index in range(units)]
+        clients = [AsyncModbusTcpClient("127.0.0.1", port=simulator.port) for simulator in simulators]
+        try:
+            for client in clients:
+                await client.connect()
+            coordinators = [_build(hass, NilanBus(client), RegisterMap(DEFAULT_MODEL))[0] for client in clients]
+            row["separate_ports"] = await _measure_concurrent(coordinators, args.cycles)
+        finally:
+            for client in clients:
+                client.close()
+            for simulator in simulators:
+                simulator.stop()
+        results[units] = row
+    return results
+
+
+async def _measure_pipeline(hass, args):
+    """Compare full cycles over a delayed link, serialized and pipelined."""
+    results = {}
+    port = args.port + args.units + 2
+    with NilanSimulator(port, args.latency / 1000, DEFAULT_SLAVE), NetworkLink(port + 1, port, args.rtt / 1000):
+        for depth in sorted({1, args.pipeline}):
+            client = AsyncModbusTcpClient("127.0.0.1", port=port + 1)
+            await client.connect()
+            metered = MeteredClient(client)
+            try:
+                coordinator, climate = _build(hass, NilanBus(metered, pipeline_depth=depth), RegisterMap(DEFAULT_MODEL))
+                results[depth] = await _measure_cycles(metered, coordinator, climate, GROUPS, args.cycles)
+            finally:
+                client.close()
+    return results
+
+
+async def _measure_proxy(hass, args):
+    """Measure the bus transactions of consumers polling the full read plan through the proxy."""
+    port = args.port + args.units + 4
+    with NilanSimulator(port, args.latency / 1000, DEFAULT_SLAVE):
+        client = AsyncModbusTcpClient("127.0.0.1", port=port)
+        await client.connect()
+        metered = MeteredClient(client)
+        proxy = NilanProxy("127.0.0.1", port + 1, allow_writes=True)
+        consumers = [AsyncModbusTcpClient("127.0.0.1", port=port + 1) for _ in range(args.consumers)]
+        try:
+            coordinator, _ = _build(hass, NilanBus(metered), RegisterMap(DEFAULT_MODEL), image=RegisterImage())
+            proxy.add_unit(coordinator)
+            await proxy.async_start()
+            for consumer in consumers:
+                await consumer.connect()
+            await _refresh(coordinator, GROUPS)
+            plan = coordinator.register_map.read_plan
+            errors = 0
+
+            async def consume(consumer):
+                nonlocal errors
+                for _ in range(args.cycles):
+                    for block in plan:
+                        read = consumer.read_input_registers if block.table == INPUT else consumer.read_holding_registers
+                        result = await read(block.address, count=block.count, slave=DEFAULT_SLAVE)
+                        errors += result.isError()
+
+            async def poll():
+                for _ in range(args.cycles):
+                    await _refresh(coordinator, GROUPS)
+
+            metered.reset()
+            start = time.perf_counter()
+            await asyncio.gather(poll(), *(consume(consumer) for consumer in consumers))
+            results = {
+                "consumers": args.consumers,
+                "consumer_requests": args.consumers * args.cycles * len(plan),
+                "consumer_errors": errors,
+                "bus_transactions": metered.transactions,
+                "polling_transactions": args.cycles * len(plan),
+                "wall_time": time.perf_counter() - start,
+                "proxy": proxy.stats(),
+            }
+            # A write from a consumer reaches the unit and the integration's snapshot
+            register_map = coordinator.register_map
+            metered.reset()
+            await consumers[0].write_register(
+                register_map.address("target_temperature"),
+                register_map.encode_value("target_temperature", 23.5),
+                slave=DEFAULT_SLAVE,
+            )
+            results["write_transactions"] = metered.transactions
+            results["write_in_snapshot"] = coordinator.data["target_temperature"] == 23.5
+        finally:
+            for consumer in consumers:
+                consumer.close()
+            await proxy.async_stop()
+            client.close()
+    return results
+
+
+# Operating state written to the simulator and whether the temperatures move every cycle
+STATES = {
+    "working": (6, True),
+    "stable": (6, False),
+    "standby": (4, False),
+    "defrost": (13, True),
+}
+
+
+async def _simulate_hour(simulator, metered, coordinator, moving):
+    """Run the cycles and fast path reads of one hour of polling on a shifted clock and count the transactions."""
+    await _refresh(coordinator, GROUPS)
+    metered.reset()
+    elapsed = 0.0
+    next_fast_path = DEFAULT_ALARM_INTERVAL
+    cycles = 0
+    fast_path_reads = 0
+    while elapsed < 3600:
+        tick = coordinator.update_interval.total_seconds()
+        elapsed += tick
+        # The fast path reads that fall before this cycle
+        while next_fast_path <= min(elapsed, 3600):
+            if not coordinator.schedule.fast_path_covered(DEFAULT_ALARM_INTERVAL):
+                await coordinator._async_poll_fast_path()
+                fast_path_reads += 1
+            next_fast_path += DEFAULT_ALARM_INTERVAL
+        # The groups were read one tick earlier
+        for group in coordinator._last_read:
+            coordinator._last_read[group] -= tick
+        if moving:
+            simulator.set_input(201, 650 + 50 * (cycles % 2))
+        await coordinator.async_refresh()
+        cycles += 1
+    return {"cycles": cycles, "fast_path_reads": fast_path_reads, "transactions": metered.transactions}
+
+
+async def _measure_adaptive(hass, args):
+    """Compare the transactions of an hour of fixed and adaptive polling per operating state."""
+    results = {}
+    port = args.port + args.units + 6
+    for name, (action, moving) in STATES.items():
+        row = {}
+        for adaptive in (False, True):
+            # Only transactions are counted, the line delay would just stretch the run
+            with NilanSimulator(port, 0, DEFAULT_SLAVE) as simulator:
+                simulator.set_input(1002, action)
+                client = AsyncModbusTcpClient("127.0.0.1", port=port)
+                await client.connect()
+                metered = MeteredClient(client)
+                try:
+                    coordinator, _ = _build(hass, NilanBus(metered), RegisterMap(DEFAULT_MODEL), adaptive=adaptive)
+                    row["adaptive" if adaptive else "fixed"] = await _simulate_hour(
+                        simulator, metered, coordinator, moving
+                    )
+                finally:
+                    client.close()
+        results[name] = row
+    return results
+
+
+async def run(args):
+    """Run all benchmark scenarios and return the results."""
+    results = {"latency_ms": args.latency, "rtt_ms": args.rtt}
+    with NilanSimulator(args.port, args.latency / 1000, DEFAULT_SLAVE), tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        client = AsyncModbusTcpClient("127.0.0.1", port=args.port)
+        await client.connect()
+        metered = MeteredClient(client)
+        try:
+            scenarios = {
+                "unplanned_full_cycle": (RegisterMap(DEFAULT_MODEL, max_gap=0, max_block=1), GROUPS),
+                "full_cycle": (RegisterMap(DEFAULT_MODEL), GROUPS),
+                "fast_tick": (RegisterMap(DEFAULT_MODEL), (GROUP_FAST,)),
+            }
+            for name, (register_map, groups) in scenarios.items():
+                coordinator, climate = _build(hass, NilanBus(metered), register_map)
+                results[name] = await _measure_cycles(metered, coordinator, climate, groups, args.cycles)
+
+            coordinator, climate = _build(hass, NilanBus(metered), RegisterMap(DEFAULT_MODEL))
+            await _refresh(coordinator, GROUPS)
+            results["setters"] = await _measure_setters(metered, climate)
+            results["write_latency_under_polling"] = await _measure_write_latency(coordinator, climate, args.writes)
+        finally:
+            client.close()
+        try:
+            results["units"] = await _measure_units(hass, args)
+            results["pipeline"] = await _measure_pipeline(hass, args)
+            results["proxy"] = await _measure_proxy(hass, args)
+            results["adaptive"] = await _measure_adaptive(hass, args)
+        finally:
+            await hass.async_stop(force=True)
+    return results
+
+
+def _build(hass, bus, register_map, slave=DEFAULT_SLAVE, image=None, adaptive=False):
+    """Create a coordinator and climate entity for one unit on the given bus."""
+    coordinator = NilanCoordinator(hass, bus, slave, register_map, dict(INTERVALS), image=image, adaptive=adaptive)
+    coordinator.config_entry = types.SimpleNamespace(entry_id=f"bench_{slave}", title=f"Nilan bench {slave}")
+    climate = NilanClimateEntity(hass, coordinator)
+    # The entity is not attached to a platform, so there is no state to write
+    climate.schedule_update_ha_state = lambda *args, **kwargs: None
+    return coordinator, climate
+
+
+def _report(results):
+    """Print the results as a readable table."""
+    print(f"Per-transaction latency: {results['latency_ms']} ms")
+    print(f"{'scenario':<24}{'transactions':>14}{'bytes':>10}{'wall time':>12}")
+    for name in ("unplanned_full_cycle", "full_cycle", "fast_tick"):
+        row = results[name]
+        print(
+            f"{name:<24}{row['transactions_per_cycle']:>14.1f}{row['bytes_per_cycle']:>10.0f}"
+            f"{row['wall_time_per_cycle'] * 1000:>10.1f}ms"
+        )
+    print()
+    print(f"{'setter':<24}{'transactions':>14}{'bytes':>10}{'latency':>12}")
+    for name, row in results["setters"].items():
+        print(f"{name:<24}{row['transactions']:>14}{row['bytes']:>10}{row['latency'] * 1000:>10.1f}ms")
+    print()
+    latency = results["write_latency_under_polling"]
+    print(
+        f"set_temperature under polling: mean {latency['mean'] * 1000:.1f} ms, "
+        f"p95 {latency['p95'] * 1000:.1f} ms, max {latency['max'] * 1000:.1f} ms "
+        f"over {latency['writes']} writes"
+    )
+    print()
+    print(f"{'units':<24}{'shared line':>14}{'separate ports':>16}")
+    for units, row in results["units"].items():
+        print(f"{units:<24}{row['shared_line'] * 1000:>12.1f}ms{row['separate_ports'] * 1000:>14.1f}ms")
+    print()
+    print(f"Full cycle over a link with {results['rtt_ms']} ms round trip")
+    print(f"{'requests in flight':<24}{'transactions':>14}{'wall time':>12}")
+    for depth, row in results["pipeline"].items():
+        print(f"{depth:<24}{row['transactions_per_cycle']:>14.1f}{row['wall_time_per_cycle'] * 1000:>10.1f}ms")
+    print()
+    proxy = results["proxy"]
+    print(f"{proxy['consumers']} consumers polling the full read plan through the proxy")
+    print(
+        f"consumer requests {proxy['consumer_requests']} ({proxy['consumer_errors']} errors), "
+        f"bus transactions {proxy['bus_transactions']} of which {proxy['polling_transactions']} polling, "
+        f"cache hits {proxy['proxy']['cache_hits']}, forwarded reads {proxy['proxy']['forwarded_reads']}"
+    )
+    print(
+        f"consumer write: {proxy['write_transactions']} bus transactions, "
+        f"{'visible' if proxy['write_in_snapshot'] else 'not visible'} in the snapshot"
+    )
+    print()
+    print(f"One hour of polling per operating state, alarm fast path every {DEFAULT_ALARM_INTERVAL} s")
+    print(
+        f"{'state':<24}{'fixed cycles':>14}{'fast path':>11}{'transactions':>14}"
+        f"{'adaptive cycles':>17}{'fast path':>11}{'transactions':>14}"
+    )
+    for name, row in results["adaptive"].items():
+        fixed, adaptive = row["fixed"], row["adaptive"]
+        print(
+            f"{name:<24}{fixed['cycles']:>14}{fixed['fast_path_reads']:>11}{fixed['transactions']:>14}"
+            f"{adaptive['cycles']:>17}{adaptive['fast_path_reads']:>11}{adaptive['transactions']:>14}"
+        )
+
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--latency", type=float, default=20.0, help="per-transaction latency in ms")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--units", type=int, default=4, help="largest number of units to compare")
+    parser.add_argument("--rtt", type=float, default=50.0, help="network round trip of the pipelining scenario in ms")
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight in the pipelining scenario")
+    parser.add_argument("--consumers", type=int, default=3, help="consumers polling through the proxy")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        _report(results)
+
+
+if __name__ == "__main__":
+    main()
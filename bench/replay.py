@@ -0,0 +1,106 @@
+"""Replay a recorded bus trace through the integration's coordinator.
+
+Feeds the responses of a trace written by the integration's ``trace``
+option to the real bus, coordinator and climate entity, at the recorded
+timing or accelerated, and reports the cycle durations, failed cycles and
+the entity state reached at the end of the trace. With ``--record`` a
+trace is captured from bench.simulator first, which is handy to try the
+replay without a unit at hand.
+
+    python -m bench.replay trace.bin --speed 10
+    python -m bench.replay trace.bin --record --latency 20 --cycles 20
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from homeassistant.core import HomeAssistant
+from pymodbus.client import AsyncModbusTcpClient
+
+from custom_components.nilan.bus import NilanBus
+from custom_components.nilan.const import DEFAULT_MODEL, GROUPS
+from custom_components.nilan.registers import RegisterMap
+from custom_components.nilan.trace import ReplayClient, TraceRecorder, TracingClient
+
+from .poll_cycle import _build, _refresh
+from .simulator import DEFAULT_SLAVE, NilanSimulator
+
+
+async def record(args):
+    """Capture a trace of full cycles against the simulator."""
+    with NilanSimulator(args.port, args.latency / 1000, DEFAULT_SLAVE), tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        client = AsyncModbusTcpClient("127.0.0.1", port=args.port)
+        await client.connect()
+        recorder = TraceRecorder(args.trace)
+        try:
+            coordinator, _ = _build(hass, NilanBus(TracingClient(client, recorder)), RegisterMap(DEFAULT_MODEL))
+            for _ in range(args.cycles):
+                await _refresh(coordinator, GROUPS)
+        finally:
+            client.close()
+            recorder.flush()
+            await hass.async_stop(force=True)
+
+
+async def replay(args):
+    """Run full cycles against the trace until it is exhausted and return the results."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        client = ReplayClient.from_file(args.trace, args.speed)
+        try:
+            coordinator, climate = _build(hass, NilanBus(client), RegisterMap(DEFAULT_MODEL), args.slave)
+            durations = []
+            failed = 0
+            while len(durations) < args.max_cycles:
+                start = time.perf_counter()
+                await _refresh(coordinator, GROUPS)
+                durations.append(time.perf_counter() - start)
+                if coordinator.last_update_success:
+                    climate._apply_snapshot(coordinator.data)
+                else:
+                    failed += 1
+                if client.exhausted:
+                    break
+        finally:
+            await hass.async_stop(force=True)
+    return {
+        "cycles": len(durations),
+        "failed_cycles": failed,
+        "unanswered_requests": client.unanswered,
+        "mean_cycle": statistics.mean(durations) * args.speed if durations else None,
+        "max_cycle": max(durations) * args.speed if durations else None,
+        "state": climate.extra_state_attributes,
+    }
+
+
+def main():
+    """Parse arguments and replay the trace."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor, 10 runs ten times faster")
+    parser.add_argument("--slave", type=int, default=DEFAULT_SLAVE)
+    parser.add_argument("--max-cycles", type=int, default=1000)
+    parser.add_argument("--record", action="store_true", help="capture the trace from the simulator first")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--latency", type=float, default=20.0, help="simulator per-transaction latency in ms")
+    parser.add_argument("--cycles", type=int, default=20, help="cycles to record")
+    args = parser.parse_args()
+    if args.record:
+        asyncio.run(record(args))
+    results = asyncio.run(replay(args))
+    print(f"Replayed {results['cycles']} cycles, {results['failed_cycles']} failed")
+    print(f"Requests missing from the trace: {results['unanswered_requests']}")
+    if results["cycles"]:
+        print(
+            f"Cycle duration at recorded timing: mean {results['mean_cycle'] * 1000:.1f} ms, "
+            f"max {results['max_cycle'] * 1000:.1f} ms"
+        )
+    for key, value in results["state"].items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Simulated Nilan Compact P Nordic served over loopback Modbus TCP.
+
+The simulator runs a pymodbus server in a background thread with a
+register image taken from a Compact P Nordic in normal operation. Only
+the register ranges the unit implements are mapped, so reads outside
+them answer with an illegal address exception like the real device.
+Every transaction is delayed by a configurable latency to mimic the
+serial line. Several units can share one simulated line, each answering
+on its own slave address from consecutive addresses on.
+
+Run it standalone to point a development Home Assistant at it:
+
+    python -m bench.simulator --port 5020 --latency 20
+"""
+import argparse
+import asyncio
+import threading
+
+from pymodbus.datastore import ModbusServerContext, ModbusSlaveContext, ModbusSparseDataBlock
+from pymodbus.server import ModbusTcpServer
+
+DEFAULT_SLAVE = 30
+
+# Register ranges implemented by the unit, with known values filled in
+INPUT_RANGES = ((100, 110), (200, 222), (400, 410), (1000, 1010), (1100, 1110), (1200, 1210), (3100, 3110))
+HOLDING_RANGES = ((1000, 1010), (1100, 1110), (1200, 1210), (1700, 1705))
+
+INPUT_IMAGE = {
+    201: 650,  # Intake temperature, 6.50 °C
+    202: 1780,  # Supply temperature after the heat exchanger
+    204: 2150,  # Room exhaust temperature
+    211: 5200,  # Hot water top temperature
+    212: 4400,  # Hot water bottom temperature
+    216: 300,  # Hot water anode
+    221: 4500,  # Humidity, 45 %
+    400: 0,  # Alarm status
+    1002: 6,  # Control state: ventilation
+    1101: 2,  # Inlet fan step
+    1102: 2,  # Exhaust fan step
+    1103: 40,  # Days since filter change
+    1104: 50,  # Days to filter change
+    1202: 2100,  # Room temperature
+    1205: 5000,  # Requested capacity
+    1206: 4800,  # Actual capacity
+    3102: 1,  # Ventilation state
+}
+
+HOLDING_IMAGE = {
+    1002: 1,  # Operating mode: heat
+    1003: 2,  # Fan mode: normal-low
+    1004: 2100,  # Target temperature
+    1100: 1,  # Air exchange mode: comfort
+    1200: 3,  # Cooling setpoint: set + 2 °C
+    1700: 5500,  # Hot water top setpoint
+    1701: 4500,  # Hot water bottom setpoint
+}
+
+
+def _block(ranges, image):
+    """Build a sparse data block covering the implemented ranges."""
+    values = {}
+    for first, last in ranges:
+        for address in range(first, last + 1):
+            values[address] = image.get(address, 0)
+    return ModbusSparseDataBlock(values)
+
+
+class SimulatedSlaveContext(ModbusSlaveContext):
+    """Slave context that delays every transaction by a fixed latency."""
+
+    def __init__(self, latency=0.0, **kwargs):
+        """Initialize the context."""
+        super().__init__(zero_mode=True, **kwargs)
+        self.latency = latency
+        self.transactions = 0
+        # Home Assistant patches time.sleep to flag blocking calls in any
+        # event loop, so the simulator waits on an event that never fires
+        self._line = threading.Event()
+
+    def validate(self, fc_as_hex, address, count=1):
+        """Validate a request after the simulated line delay."""
+        self.transactions += 1
+        if self.latency:
+            self._line.wait(self.latency)
+        return super().validate(fc_as_hex, address, count)
+
+
+class NilanSimulator:
+    """Background Modbus TCP server emulating Nilan units on one line."""
+
+    def __init__(self, port=5020, latency=0.0, slave=DEFAULT_SLAVE, host="127.0.0.1", units=1):
+        """Initialize the simulator."""
+        self.host = host
+        self.port = port
+        self.slave = slave
+        self.slaves = tuple(range(slave, slave + units))
+        self.contexts = {
+            unit: SimulatedSlaveContext(
+                latency=latency,
+                ir=_block(INPUT_RANGES, INPUT_IMAGE),
+                hr=_block(HOLDING_RANGES, HOLDING_IMAGE),
+            )
+            for unit in self.slaves
+        }
+        self.context = self.contexts[slave]
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def transactions(self):
+        """Return the number of transactions served so far."""
+        return sum(context.transactions for context in self.contexts.values())
+
+    def holding(self, address):
+        """Return the current value of a holding register."""
+        return self.context.store["h"].getValues(address, 1)[0]
+
+    def set_input(self, address, value):
+        """Change the value of an input register."""
+        self.context.store["i"].setValues(address, [value])
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="nilan-simulator", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+        return self
+
+    def stop(self):
+        """Stop the server and wait for the thread to exit."""
+        if self._server is not None:
+            asyncio.run_coroutine_threadsafe(self._server.shutdown(), self._loop).result(5)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        """Run the server event loop."""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """Create the server inside the simulator loop and serve requests."""
+        self._loop = asyncio.get_running_loop()
+        self._server = ModbusTcpServer(
+            ModbusServerContext(slaves=self.contexts, single=False),
+            address=(self.host, self.port),
+        )
+        await self._server.listen()
+        self._started.set()
+        await self._server.serving
+
+    def __enter__(self):
+        """Start the simulator as a context manager."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the simulator when leaving the context."""
+        self.stop()
+
+
+class NetworkLink:
+    """Loopback TCP relay adding a round-trip delay in front of the simulator.
+
+    Every chunk is delivered half the round trip after it was received, in
+    each direction and in order, without waiting for earlier chunks to be
+    answered. Requests pipelined over the link therefore overlap like on a
+    VPN to a remote gateway, while the simulator behind it still serves
+    them one at a time like the serial line.
+    """
+
+    def __init__(self, port, target_port, rtt, host="127.0.0.1"):
+        """Initialize the link."""
+        self.host = host
+        self.port = port
+        self.target_port = target_port
+        self.rtt = rtt
+        self._writers = set()
+        self._relays = set()
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def start(self):
+        """Start relaying in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="nilan-link", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+        return self
+
+    def stop(self):
+        """Stop relaying and wait for the thread to exit."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        """Run the relay event loop."""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        """Accept connections until the server is closed."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._relay, self.host, self.port)
+        self._started.set()
+        try:
+            await self._server.wait_closed()
+        finally:
+            # Closed connections end their relays, which the stream server expects to finish
+            for writer in self._writers:
+                writer.close()
+            if self._relays:
+                await asyncio.wait(self._relays, timeout=1)
+
+    async def _relay(self, reader, writer):
+        """Relay one client connection to the simulator in both directions."""
+        self._relays.add(asyncio.current_task())
+        target_reader, target_writer = await asyncio.open_connection(self.host, self.target_port)
+        self._writers.update((writer, target_writer))
+        await asyncio.gather(
+            self._pump(reader, target_writer), self._pump(target_reader, writer), return_exceptions=True
+        )
+        self._writers.difference_update((writer, target_writer))
+        self._relays.discard(asyncio.current_task())
+
+    async def _pump(self, reader, writer):
+        """Forward chunks in order, each one half a round trip after it arrived."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while (item := await queue.get()) is not None:
+                due, data = item
+                await asyncio.sleep(max(due - loop.time(), 0))
+                writer.write(data)
+
+        delivery = asyncio.create_task(deliver())
+        try:
+            while data := await reader.read(4096):
+                queue.put_nowait((loop.time() + self.rtt / 2, data))
+        finally:
+            queue.put_nowait(None)
+            await delivery
+            writer.close()
+
+    def __enter__(self):
+        """Start the link as a context manager."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the link when leaving the context."""
+        self.stop()
+
+
+def main():
+    """Run the simulator until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--slave", type=int, default=DEFAULT_SLAVE)
+    parser.add_argument("--latency", type=float, default=20.0, help="per-transaction latency in ms")
+    parser.add_argument("--units", type=int, default=1, help="units sharing the line")
+    args = parser.parse_args()
+    with NilanSimulator(args.port, args.latency / 1000, args.slave, units=args.units) as simulator:
+        slaves = ", ".join(str(slave) for slave in simulator.slaves)
+        print(f"Simulated Nilan units {slaves} on 127.0.0.1:{args.port}, Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
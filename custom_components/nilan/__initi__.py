@@ -1,45 +1,286 @@
 import logging
-from homeassistant.core import HomeAssistant
-from pymodbus.client import AsyncModbusSerialClient
-from .const import DOMAIN
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_ALARM_INTERVAL,
+    CONF_CALIBRATION,
+    CONF_COLLECT_METRICS,
+    CONF_FAST_INTERVAL,
+    CONF_MAX_BLOCK,
+    CONF_MAX_GAP,
+    CONF_MODEL,
+    CONF_NORMAL_INTERVAL,
+    CONF_PERCENTAGE_DEADBAND,
+    CONF_PIPELINE_DEPTH,
+    CONF_PROXY_HOST,
+    CONF_PROXY_MAX_AGE,
+    CONF_PROXY_PORT,
+    CONF_PROXY_WRITES,
+    CONF_SAMPLE_CAPACITY,
+    CONF_SLOW_INTERVAL,
+    CONF_STATISTICS_WINDOW,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_TRACE,
+    CONF_TRANSPORT,
+    DEADBAND_PERCENTAGE,
+    DEADBAND_TEMPERATURE,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_ALARM_INTERVAL,
+    DEFAULT_COLLECT_METRICS,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_MAX_BLOCK,
+    DEFAULT_MAX_GAP,
+    DEFAULT_MODEL,
+    DEFAULT_NORMAL_INTERVAL,
+    DEFAULT_PERCENTAGE_DEADBAND,
+    DEFAULT_PIPELINE_DEPTH,
+    DEFAULT_PROXY_HOST,
+    DEFAULT_PROXY_MAX_AGE,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_PROXY_WRITES,
+    DEFAULT_SAMPLE_CAPACITY,
+    DEFAULT_SLOW_INTERVAL,
+    DEFAULT_STATISTICS_WINDOW,
+    DEFAULT_TEMPERATURE_DEADBAND,
+    DEFAULT_TRACE,
+    DOMAIN,
+    GROUP_FAST,
+    GROUP_NORMAL,
+    GROUP_SLOW,
+    PLATFORMS,
+    STORAGE_VERSION,
+    TRACE_FLUSH_INTERVAL,
+    TRANSPORT_TCP,
+)
+from .bus import NilanBus
+from .calibration import apply_calibration, calibrated_spans
+from .client import create_client, port_key
+from .coordinator import NilanCoordinator
+from .derived import NilanDerived
+from .metrics import BusMetrics
+from .proxy import NilanProxy, RegisterImage
+from .registers import RegisterMap
+from .samples import NilanSamples
+from .trace import TraceRecorder, TracingClient
 
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the Nilan integration."""
-    hass.data[DOMAIN] = {}
+    hass.data[DOMAIN] = {"ports": {}, "proxies": {}}
 
     return True
 
 async def async_setup_entry(hass, entry):
     """Set up Nilan from a config entry."""
     config_data = entry.data
+    slave = config_data['slave']
+    await er.async_migrate_entries(hass, entry.entry_id, _migrate_unique_id)
 
-    # Create the Modbus client
-    modbus_client = AsyncModbusSerialClient(
-        method='rtu',
-        port=config_data['port'],
-        baudrate=config_data['baudrate'],
-        parity=config_data['parity'],
-        stopbits=config_data['stopbits'],
-        timeout=3
+    # Units on the same serial port or gateway share one client and bus
+    port = _acquire_port(hass, config_data, entry.entry_id)
+    if config_data.get(CONF_TRANSPORT) == TRANSPORT_TCP:
+        _configure_pipeline(port, entry.options.get(CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH))
+    if entry.options.get(CONF_TRACE, DEFAULT_TRACE):
+        _start_trace(hass, port, config_data, entry.entry_id)
+    # Measured by the calibrate_bus service
+    calibration = config_data.get(CONF_CALIBRATION)
+    if calibration is not None:
+        apply_calibration(port["bus"], calibration)
+    metrics = BusMetrics() if entry.options.get(CONF_COLLECT_METRICS, DEFAULT_COLLECT_METRICS) else None
+    if metrics is not None:
+        port["bus"].metrics[slave] = metrics
+    register_map = RegisterMap(
+        config_data.get(CONF_MODEL, DEFAULT_MODEL),
+        config_data.get(CONF_MAX_GAP, DEFAULT_MAX_GAP),
+        config_data.get(CONF_MAX_BLOCK, DEFAULT_MAX_BLOCK),
+        calibrated_spans(calibration),
     )
 
-    # Attempt to connect the Modbus client
-    connection = await modbus_client.connect()
+    options = entry.options
+    intervals = {
+        GROUP_FAST: options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL),
+        GROUP_NORMAL: options.get(CONF_NORMAL_INTERVAL, DEFAULT_NORMAL_INTERVAL),
+        GROUP_SLOW: options.get(CONF_SLOW_INTERVAL, DEFAULT_SLOW_INTERVAL),
+    }
+    deadbands = {
+        DEADBAND_TEMPERATURE: options.get(CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND),
+        DEADBAND_PERCENTAGE: options.get(CONF_PERCENTAGE_DEADBAND, DEFAULT_PERCENTAGE_DEADBAND),
+    }
+    proxy_port = options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT)
+    capacity = options.get(CONF_SAMPLE_CAPACITY, DEFAULT_SAMPLE_CAPACITY)
+    samples = None
+    if capacity:
+        samples = NilanSamples(
+            register_map.sampled_keys(),
+            capacity,
+            (options.get(CONF_STATISTICS_WINDOW, DEFAULT_STATISTICS_WINDOW),),
+        )
+    coordinator = NilanCoordinator(
+        hass,
+        port["bus"],
+        slave,
+        register_map,
+        intervals,
+        deadbands,
+        metrics=metrics,
+        store=_snapshot_store(hass, entry),
+        samples=samples,
+        derived=NilanDerived(),
+        image=RegisterImage() if proxy_port else None,
+        adaptive=options.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING),
+    )
+    # Entities start from the last persisted snapshot instead of waiting for the bus
+    await coordinator.async_restore()
+    hass.data[DOMAIN][entry.entry_id] = {
+        "bus": port["bus"],
+        "slave": slave,
+        "register_map": register_map,
+        "coordinator": coordinator,
+        "proxy": None,
+    }
+    if proxy_port:
+        hass.data[DOMAIN][entry.entry_id]["proxy"] = await _async_attach_proxy(hass, coordinator, proxy_port, options)
 
-    if connection:
-        hass.data[DOMAIN]["modbus_client"] = modbus_client
-        hass.data[DOMAIN]["slave"] = config_data['slave']
-        _LOGGER.info("Modbus client successfully connected.")
-    else:
-        _LOGGER.error("Failed to connect Modbus client.")
-        return False  # Return False if the client fails to connect
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    alarm_interval = options.get(CONF_ALARM_INTERVAL, DEFAULT_ALARM_INTERVAL)
+    if alarm_interval:
+        entry.async_on_unload(coordinator.async_start_fast_path(alarm_interval))
 
-    # Set up the climate platform after Modbus client is ready
-    await hass.config_entries.async_forward_entry_setups(entry, ["climate"])
+    # The bus connects on its first request, so connecting and the first
+    # cycle finish in the background without holding up startup
+    entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} first refresh")
     return True
 
+def _snapshot_store(hass, entry):
+    """Return the store holding the entry's last snapshot."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+
+def _acquire_port(hass, config_data, entry_id):
+    """Return the shared client and bus of a unit's port, creating them on first use."""
+    ports = hass.data[DOMAIN]["ports"]
+    key = port_key(config_data)
+    if key not in ports:
+        # Create the Modbus client for the configured transport
+        modbus_client = create_client(config_data)
+        ports[key] = {
+            "modbus_client": modbus_client,
+            "bus": NilanBus(modbus_client),
+            "entries": set(),
+            # Entries that asked for the port's trace
+            "trace_entries": set(),
+        }
+    ports[key]["entries"].add(entry_id)
+    return ports[key]
+
+def _configure_pipeline(port, depth):
+    """Allow several transactions in flight on a Modbus TCP connection."""
+    # Units behind one gateway share the connection, the deepest setting wins
+    pipeline = port["bus"].pipeline
+    if depth > pipeline.depth:
+        pipeline.depth = depth
+        _LOGGER.debug("Pipelining up to %s Modbus TCP requests", depth)
+
+def _start_trace(hass, port, config_data, entry_id):
+    """Record every transaction of a port to a rotating trace file."""
+    port["trace_entries"].add(entry_id)
+    if "trace" in port:
+        return
+    recorder = TraceRecorder(hass.config.path(DOMAIN, f"trace_{slugify(port_key(config_data))}.bin"))
+    # The tracer sits below the bus, so it sees exactly what goes on the wire
+    port["bus"].client = TracingClient(port["modbus_client"], recorder)
+
+    async def _async_flush(now=None):
+        await hass.async_add_executor_job(recorder.flush)
+
+    port["trace"] = recorder
+    port["cancel_trace_flush"] = async_track_time_interval(
+        hass, _async_flush, timedelta(seconds=TRACE_FLUSH_INTERVAL), cancel_on_shutdown=True
+    )
+    _LOGGER.info("Tracing Modbus transactions to %s", recorder.path)
+
+async def _async_stop_trace(hass, port):
+    """Stop recording a port's transactions and flush what is left."""
+    port["cancel_trace_flush"]()
+    recorder = port.pop("trace")
+    # The bus talks to the real client again
+    port["bus"].client = port["modbus_client"]
+    await hass.async_add_executor_job(recorder.flush)
+
+async def _async_release_port(hass, config_data, entry_id):
+    """Detach a unit from its port, closing the client after the last one."""
+    ports = hass.data[DOMAIN]["ports"]
+    key = port_key(config_data)
+    port = ports[key]
+    port["entries"].discard(entry_id)
+    port["trace_entries"].discard(entry_id)
+    port["bus"].metrics.pop(config_data['slave'], None)
+    if "trace" in port and not port["trace_entries"]:
+        # Units still on the port did not ask for the trace
+        await _async_stop_trace(hass, port)
+    if not port["entries"]:
+        del ports[key]
+        port["modbus_client"].close()
+
+async def _async_attach_proxy(hass, coordinator, port, options):
+    """Serve a unit on the Modbus TCP proxy of a port, starting the proxy on first use.
+
+    The listen address, cache age and write permission of the first entry
+    on a port apply to every unit served on it.
+    """
+    proxies = hass.data[DOMAIN]["proxies"]
+    proxy = proxies.get(port)
+    try:
+        if proxy is None:
+            proxy = NilanProxy(
+                options.get(CONF_PROXY_HOST, DEFAULT_PROXY_HOST),
+                port,
+                options.get(CONF_PROXY_MAX_AGE, DEFAULT_PROXY_MAX_AGE),
+                options.get(CONF_PROXY_WRITES, DEFAULT_PROXY_WRITES),
+            )
+            await proxy.async_start()
+            proxies[port] = proxy
+        proxy.add_unit(coordinator)
+    except (OSError, ValueError) as e:
+        # The integration keeps polling without the proxy
+        _LOGGER.error("Cannot serve Nilan slave %s on Modbus TCP port %s: %s", coordinator.slave, port, e)
+        return None
+    return proxy
+
+async def _async_detach_proxy(hass, proxy, slave):
+    """Stop serving a unit, closing the proxy after the last one."""
+    proxy.remove_unit(slave)
+    if not proxy.units:
+        hass.data[DOMAIN]["proxies"].pop(proxy.port, None)
+        await proxy.async_stop()
+
+@callback
+def _migrate_unique_id(entity_entry):
+    """Scope unique IDs from the single-unit releases to their config entry."""
+    if entity_entry.unique_id.startswith("nilan_"):
+        return {"new_unique_id": f"{entity_entry.config_entry_id}_{entity_entry.unique_id[len('nilan_'):]}"}
+    return None
+
+async def async_reload_entry(hass, entry):
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_unload_entry(hass, entry):
     """Unload a config entry."""
-    return await hass.config_entries.async_forward_entry_unload(entry, "climate")
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        if entry_data["proxy"] is not None:
+            await _async_detach_proxy(hass, entry_data["proxy"], entry_data["slave"])
+        await _async_release_port(hass, entry.data, entry.entry_id)
+    return unload_ok
+
+async def async_remove_entry(hass, entry):
+    """Remove the persisted snapshot of a deleted entry."""
+    await _snapshot_store(hass, entry).async_remove()
@@ -0,0 +1,46 @@
+from homeassistant.components.binary_sensor import BinarySensorDeviceClass, BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .entity import NilanEntity
+from .registers import ALARM_CODE_KEYS, ALARM_STATUS, decode_alarms
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback
+):
+    """Set up Nilan binary sensors from a config entry."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinator"]
+    async_add_entities([NilanAlarmBinarySensor(coordinator)])
+
+
+class NilanAlarmBinarySensor(NilanEntity, BinarySensorEntity):
+    """Alarm indicator derived from the alarm status register.
+
+    The alarm registers are refreshed by the coordinator's fast path, so
+    the sensor follows an alarm within about a second.
+    """
+
+    _attr_device_class = BinarySensorDeviceClass.PROBLEM
+
+    def __init__(self, coordinator):
+        """Initialize the binary sensor."""
+        super().__init__(coordinator, "alarm")
+        self._attr_name = "Nilan Alarm"
+        self._alarm = None
+        self._apply_snapshot(coordinator.data)
+
+    def _apply_snapshot(self, values):
+        """Take the alarm status and the alarm list from the snapshot."""
+        alarm = tuple(values.get(key) for key in (ALARM_STATUS, *ALARM_CODE_KEYS))
+        if alarm == self._alarm:
+            return False
+        self._alarm = alarm
+        alarm_status = alarm[0]
+        self._attr_is_on = None if alarm_status is None else alarm_status != 0
+        self._attr_extra_state_attributes = {"alarm_status": alarm_status, "alarms": decode_alarms(values)}
+        return True
@@ -0,0 +1,378 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import NamedTuple, Optional
+
+from pymodbus.exceptions import ConnectionException, ModbusException, ModbusIOException
+from pymodbus.pdu import ModbusExceptions
+
+from .const import DEFAULT_WRITE_DEBOUNCE, MAX_WRITE_BLOCK
+from .metrics import FC_READ_HOLDING, FC_READ_INPUT, FC_READ_WRITE_MULTIPLE, FC_WRITE_MULTIPLE
+from .resilience import AdaptiveTimeout, PipelineLimit
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_SCAN = 2  # Diagnostic bulk reads, always behind polling
+
+# Exception responses of a gateway that could not forward an overlapping request
+_GATEWAY_BUSY = (
+    ModbusExceptions.SlaveBusy,
+    ModbusExceptions.GatewayPathUnavailable,
+    ModbusExceptions.GatewayNoResponse,
+)
+
+
+class VerifiedWrite(NamedTuple):
+    """The raw value a queued write sent and the value the unit held afterwards."""
+
+    sent: int
+    # None if the write went through but the read-back failed
+    read_back: Optional[int]
+
+
+class _WaitStats:
+    """Running wait time statistics for one priority class."""
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, waited):
+        """Record the time one transaction waited for the bus."""
+        self.count += 1
+        self.total += waited
+        if waited > self.max:
+            self.max = waited
+
+    def as_dict(self):
+        """Return the statistics as a plain dict."""
+        return {
+            "transactions": self.count,
+            "mean_wait": self.total / self.count if self.count else 0.0,
+            "max_wait": self.max,
+        }
+
+
+class NilanBus:
+    """Serialize all transactions on the half-duplex bus.
+
+    The bus exposes the same read and write methods as the pymodbus client
+    it wraps, so callers use it as a drop-in client. Only one transaction is
+    on the wire at a time and queued writes are always granted the bus
+    before queued reads, and polling reads before diagnostic scans. Because
+    a poll cycle is made of separate block reads, a pending write is sent
+    between two blocks instead of waiting for the whole cycle.
+
+    Single register writes are collected for a short debounce window. A
+    later write to the same register replaces the earlier value, and
+    adjacent registers are sent together as one multi-register write.
+    Every write is read back to confirm it. Where the unit supports it,
+    the write goes out as a read/write multiple registers request (FC23),
+    whose response is already the read-back. Otherwise a plain write is
+    followed by a read of the written registers.
+
+    Each request is given a timeout adapted to the round-trip times the bus
+    observed so far, so an unresponsive unit costs a fraction of the fixed
+    client timeout per request. A connection that was dropped after a
+    timeout is re-established before the next request is sent. Adapters
+    that need a silent interval between two requests get ``request_gap``
+    seconds between the end of one transaction and the next. A read can
+    ask for its own ``gap`` instead, which only spaces that request.
+
+    Behind a Modbus TCP gateway up to ``pipeline_depth`` transactions can
+    be in flight at once, matched to their responses by transaction id, so
+    the block reads of a cycle share one network round trip. Priorities
+    still decide which queued transaction is sent next. When an
+    overlapping transaction fails, the bus falls back to one transaction
+    at a time for a while.
+
+    Several units can share one bus. Their transactions are granted in
+    arrival order, so concurrent poll cycles interleave block by block.
+    Transaction metrics are recorded per unit, for the slaves that have an
+    entry in ``metrics``.
+    """
+
+    def __init__(self, client, write_debounce=DEFAULT_WRITE_DEBOUNCE, pipeline_depth=1):
+        """Initialize the bus around a connected pymodbus client."""
+        self.client = client
+        self.write_debounce = write_debounce
+        self.metrics = {}
+        self.timeout = AdaptiveTimeout()
+        self.pipeline = PipelineLimit(pipeline_depth)
+        self.request_gap = 0.0
+        self.read_write_supported = {}
+        self._pending_writes = {}
+        self._flush_handle = None
+        self._flush_tasks = set()
+        self._connect_lock = asyncio.Lock()
+        self._in_flight = 0
+        self._last_done = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._max_queue_depth = 0
+        self._stats = {PRIORITY_WRITE: _WaitStats(), PRIORITY_READ: _WaitStats(), PRIORITY_SCAN: _WaitStats()}
+
+    @property
+    def concurrency(self):
+        """Return the number of transactions currently allowed in flight."""
+        return self.pipeline.current(time.monotonic())
+
+    @property
+    def queue_depth(self):
+        """Return the number of transactions waiting for the bus."""
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    def stats(self):
+        """Return queue depth and wait time statistics."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._max_queue_depth,
+            "writes": self._stats[PRIORITY_WRITE].as_dict(),
+            "reads": self._stats[PRIORITY_READ].as_dict(),
+            "scans": self._stats[PRIORITY_SCAN].as_dict(),
+            "timeout": self.timeout.as_dict(),
+            "pipeline": self.pipeline.as_dict(),
+            "request_gap": self.request_gap,
+        }
+
+    async def _reconnect(self):
+        """Reconnect the client right away instead of waiting for its back-off."""
+        # Closing first cancels the client's own background reconnect
+        self.client.close()
+        if not await self.client.connect():
+            raise ConnectionException("Nilan device is not reachable")
+        _LOGGER.debug("Modbus client connected")
+
+    async def _acquire(self, priority):
+        """Wait until the bus is granted to the caller."""
+        if self._in_flight < self.concurrency and not self.queue_depth:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The bus may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        """Hand the freed slot to the most urgent waiters the pipeline has room for."""
+        self._in_flight -= 1
+        concurrency = self.concurrency
+        while self._waiters and self._in_flight < concurrency:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                self._in_flight += 1
+
+    async def _transaction(self, priority, function_code, request, address, *args, gap=None, **kwargs):
+        """Run one request once the bus is granted, spaced by ``gap`` instead of the bus's gap if given."""
+        start = time.monotonic()
+        await self._acquire(priority)
+        waited = time.monotonic() - start
+        self._stats[priority].record(waited)
+        if priority == PRIORITY_WRITE:
+            _LOGGER.debug("Write waited %.3f s for the bus, %s transactions queued", waited, self.queue_depth)
+        try:
+            # Scans would flood the per-register histograms with addresses nobody polls
+            metrics = self.metrics.get(kwargs.get("slave")) if priority != PRIORITY_SCAN else None
+            return await self._timed(metrics, gap, function_code, request, address, *args, **kwargs)
+        finally:
+            self._release()
+
+    async def _timed(self, metrics, gap, function_code, request, address, *args, **kwargs):
+        """Run one request under the adaptive timeout and record its outcome."""
+        if gap is None:
+            gap = self.request_gap
+        if gap:
+            delay = self._last_done + gap - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        try:
+            return await self._send(metrics, function_code, request, address, *args, **kwargs)
+        finally:
+            self._last_done = time.monotonic()
+
+    async def _send(self, metrics, function_code, request, address, *args, **kwargs):
+        """Send one request, reconnecting first if needed, and record its outcome."""
+        # Pymodbus applies the connection's timeout to every request it sends
+        self.client.comm_params.timeout_connect = self.timeout.current
+        start = time.monotonic()
+        overlapped = self._in_flight > 1
+        try:
+            if not self.client.connected:
+                async with self._connect_lock:
+                    # Another transaction in flight may have reconnected meanwhile
+                    if not self.client.connected:
+                        await self._reconnect()
+            result = await request(address, *args, **kwargs)
+        except ModbusIOException:
+            self.timeout.backoff()
+            if overlapped or self._in_flight > 1:
+                self.pipeline.record_failure(time.monotonic())
+            if metrics is not None:
+                metrics.record_error(timeout=True)
+            raise
+        except ModbusException:
+            if metrics is not None:
+                metrics.record_error()
+            raise
+        latency = time.monotonic() - start
+        if (overlapped or self._in_flight > 1) and getattr(result, "exception_code", None) in _GATEWAY_BUSY:
+            self.pipeline.record_failure(time.monotonic())
+        # An exception response still measures the round trip
+        self.timeout.record(latency)
+        if metrics is not None:
+            if result.isError():
+                metrics.record_error()
+            else:
+                metrics.record_transaction(function_code, address, latency)
+        return result
+
+    async def read_input_registers(self, address, count=1, slave=0, priority=PRIORITY_READ, gap=None):
+        """Read input registers at background priority."""
+        return await self._transaction(
+            priority, FC_READ_INPUT, self.client.read_input_registers, address, count=count, slave=slave, gap=gap
+        )
+
+    async def read_holding_registers(self, address, count=1, slave=0, priority=PRIORITY_READ, gap=None):
+        """Read holding registers at background priority."""
+        return await self._transaction(
+            priority, FC_READ_HOLDING, self.client.read_holding_registers, address, count=count, slave=slave, gap=gap
+        )
+
+    async def write_registers(self, address, values, slave=0):
+        """Write holding registers ahead of any queued reads."""
+        return await self._transaction(
+            PRIORITY_WRITE, FC_WRITE_MULTIPLE, self.client.write_registers, address, values, slave=slave
+        )
+
+    async def readwrite_registers(self, address, values, slave=0):
+        """Write holding registers and read them back in one transaction ahead of any queued reads."""
+        return await self._transaction(
+            PRIORITY_WRITE,
+            FC_READ_WRITE_MULTIPLE,
+            self.client.readwrite_registers,
+            address,
+            len(values),
+            address,
+            values,
+            slave=slave,
+        )
+
+    async def write_register(self, address, value, slave=0):
+        """Queue a single register write and wait until it is sent.
+
+        The returned response is the one of the multi-register write that
+        carried the register, which also applies to callers whose value was
+        replaced by a later write inside the debounce window.
+        """
+        result, _, _ = await self._queue_write(address, value, slave)
+        return result
+
+    async def write_register_verified(self, address, value, slave=0):
+        """Queue a single register write and return what was sent and what the unit holds afterwards.
+
+        A later write to the same register inside the debounce window
+        replaces ``value``, so the returned ``sent`` is the value that
+        actually went out and the read-back is to be compared against it.
+        Raises ModbusException if the unit rejected the write.
+        """
+        result, sent, read_back = await self._queue_write(address, value, slave)
+        if result.isError():
+            raise ModbusException(f"Write to register {address} rejected: {result}")
+        return VerifiedWrite(sent, read_back)
+
+    async def _queue_write(self, address, value, slave):
+        """Queue a single register write and wait for its response, the value sent and the read-back."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        _, waiters = self._pending_writes.get((slave, address), (None, []))
+        waiters.append(waiter)
+        self._pending_writes[(slave, address)] = (value, waiters)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.write_debounce, self._start_flush)
+        return await waiter
+
+    def _start_flush(self):
+        """Send everything collected during the debounce window."""
+        self._flush_handle = None
+        pending, self._pending_writes = self._pending_writes, {}
+        task = asyncio.get_running_loop().create_task(self._flush_writes(pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_writes(self, pending):
+        """Coalesce pending writes into runs of adjacent registers."""
+        for slave, start, values, waiters in _write_runs(pending):
+            try:
+                result, read_back = await self._write_run(slave, start, values)
+            except Exception as e:  # Delivered to every caller of the run
+                for register_waiters in waiters:
+                    for waiter in register_waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                continue
+            for index, register_waiters in enumerate(waiters):
+                for waiter in register_waiters:
+                    if not waiter.done():
+                        waiter.set_result((
+                            result,
+                            values[index],
+                            read_back[index] if read_back is not None else None,
+                        ))
+
+    async def _write_run(self, slave, start, values):
+        """Write a run of registers and return the response with the registers read back."""
+        if self.read_write_supported.get(slave, True):
+            result = await self.readwrite_registers(start, values, slave=slave)
+            if not (result.isError() and getattr(result, "exception_code", None) == ModbusExceptions.IllegalFunction):
+                if result.isError():
+                    return result, None
+                self.read_write_supported[slave] = True
+                return result, result.registers[:len(values)]
+            _LOGGER.info("Slave %s does not support FC23, writes are read back separately", slave)
+            self.read_write_supported[slave] = False
+        result = await self.write_registers(start, values, slave=slave)
+        if result.isError():
+            return result, None
+        try:
+            read = await self._transaction(
+                PRIORITY_WRITE,
+                FC_READ_HOLDING,
+                self.client.read_holding_registers,
+                start,
+                count=len(values),
+                slave=slave,
+            )
+        except ModbusException as e:
+            _LOGGER.debug("Could not read back registers %s-%s: %s", start, start + len(values) - 1, e)
+            return result, None
+        if read.isError() or len(read.registers) < len(values):
+            return result, None
+        return result, read.registers[:len(values)]
+
+
+def _write_runs(pending):
+    """Split pending writes into runs of adjacent registers per slave, with the waiters of each register."""
+    runs = []
+    for slave, address in sorted(pending):
+        value, waiters = pending[(slave, address)]
+        if runs:
+            run_slave, start, values, run_waiters = runs[-1]
+            if run_slave == slave and start + len(values) == address and len(values) < MAX_WRITE_BLOCK:
+                values.append(value)
+                run_waiters.append(waiters)
+                continue
+        runs.append((slave, address, [value], [waiters]))
+    return runs
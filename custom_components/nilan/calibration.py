@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import statistics
+import time
+
+from pymodbus.exceptions import ModbusException
+
+from .bus import PRIORITY_SCAN
+from .const import (
+    CALIBRATION_DEADLINE,
+    CALIBRATION_LATENCY_SAMPLES,
+    CALIBRATION_RATE_BURST,
+    CALIBRATION_RATE_GAPS,
+    CALIBRATION_TIMEOUT_FACTOR,
+    DEFAULT_MAX_BLOCK,
+    DEFAULT_TIMEOUT,
+    HOLDING,
+    INPUT,
+    MIN_TIMEOUT,
+)
+from .metrics import FC_READ_HOLDING, FC_READ_INPUT
+
+_LOGGER = logging.getLogger(__name__)
+
+# Function code measured for each table
+_FUNCTION_CODES = {INPUT: FC_READ_INPUT, HOLDING: FC_READ_HOLDING}
+
+
+async def async_calibrate_bus(bus, slave, register_map):
+    """Probe the unit behind a bus and return the measured bus parameters.
+
+    Three bounded measurements are made at scan priority, so polling and
+    writes keep being served in between, and nothing is written:
+
+    - the round-trip time of a one register read, per function code;
+    - the spans of addresses the unit reads in one request, found by
+      bisecting the block size from the first mapped register of every
+      address range;
+    - the error rate of bursts of reads sent with shrinking gaps between
+      them, from which the smallest safe gap is chosen.
+
+    The result is a plain dict that can be stored in the config entry and
+    handed to :func:`apply_calibration` and :class:`RegisterMap`. Raises
+    ModbusException if the unit did not answer at all and TimeoutError if
+    the calibration did not finish within ``CALIBRATION_DEADLINE``.
+    """
+    ranges = register_map.address_ranges()
+    async with asyncio.timeout(CALIBRATION_DEADLINE):
+        latency = {}
+        for table, function_code in _FUNCTION_CODES.items():
+            addresses = [addresses[0] for (range_table, _), addresses in ranges.items() if range_table == table]
+            if addresses:
+                latency[str(function_code)] = await _measure_latency(_reader(bus, table), slave, addresses[0])
+        measured = [figures for figures in latency.values() if figures["samples"]]
+        if not measured:
+            raise ModbusException("Nilan device did not answer any calibration request")
+        spans = {INPUT: [], HOLDING: []}
+        for (table, _), addresses in ranges.items():
+            spans[table].extend(await _measure_spans(_reader(bus, table), slave, addresses))
+        probe = register_map.probe
+        rates = await _measure_rates(_reader(bus, probe.table), slave, probe.address)
+
+    request_gap = CALIBRATION_RATE_GAPS[0]
+    for rate in rates:
+        if rate["errors"]:
+            break
+        request_gap = rate["gap"]
+    slowest = max(figures["max"] for figures in measured)
+    return {
+        "latency": latency,
+        "spans": spans,
+        "rates": rates,
+        "request_gap": request_gap,
+        "rtt": max(figures["median"] for figures in measured),
+        "timeout": min(max(slowest * CALIBRATION_TIMEOUT_FACTOR, MIN_TIMEOUT), DEFAULT_TIMEOUT),
+    }
+
+
+def apply_calibration(bus, calibration):
+    """Use a stored calibration for the request gap and timeouts of a bus."""
+    # The gap is a property of the line, so the latest measurement replaces the earlier ones
+    bus.request_gap = calibration["request_gap"]
+    bus.timeout.calibrate(calibration["rtt"], calibration["timeout"])
+
+
+def calibrated_spans(calibration):
+    """Return the readable spans of a stored calibration in the form RegisterMap takes."""
+    if calibration is None:
+        return None
+    return {table: [tuple(span) for span in spans] for table, spans in calibration["spans"].items()}
+
+
+def format_report(calibration, title, current_plan, calibrated_plan):
+    """Return a plain text summary of a calibration for support requests."""
+    lines = [
+        f"Nilan bus calibration: {title}",
+        f"Date: {calibration.get('date', 'unknown')}",
+        "",
+        "Round trip per function code (ms)",
+        f"  {'function':<12}{'samples':>8}{'errors':>8}{'min':>8}{'median':>8}{'p95':>8}{'max':>8}",
+    ]
+    for function_code, figures in calibration["latency"].items():
+        row = f"  {'FC' + function_code:<12}{figures['samples']:>8}{figures['errors']:>8}"
+        if figures["samples"]:
+            row += "".join(f"{figures[key] * 1000:>8.1f}" for key in ("min", "median", "p95", "max"))
+        lines.append(row)
+    lines += ["", "Address spans read in one request"]
+    for table, spans in calibration["spans"].items():
+        for first, last in spans:
+            lines.append(f"  {table:<8}{first:>6}-{last:<6}{last - first + 1:>4} registers")
+    lines += ["", "Error rate at increasing request rates", f"  {'gap ms':>8}{'requests':>10}{'errors':>8}{'req/s':>8}"]
+    for rate in calibration["rates"]:
+        lines.append(
+            f"  {rate['gap'] * 1000:>8.0f}{rate['requests']:>10}{rate['errors']:>8}{rate['rate']:>8.1f}"
+        )
+    lines += [
+        "",
+        "Applied",
+        f"  request gap: {calibration['request_gap'] * 1000:.0f} ms",
+        f"  initial round trip: {calibration['rtt'] * 1000:.1f} ms",
+        f"  timeout ceiling: {calibration['timeout']:.2f} s",
+        f"  read plan: {len(calibrated_plan)} block reads, {len(current_plan)} before calibration",
+    ]
+    lines += [f"    {block.table} {block.address}-{block.address + block.count - 1}" for block in calibrated_plan]
+    return "\n".join(lines) + "\n"
+
+
+def _reader(bus, table):
+    """Return the bus read method of a table."""
+    return bus.read_input_registers if table == INPUT else bus.read_holding_registers
+
+
+async def _accepts(read, slave, address, count, gap=None):
+    """Return True if the unit answers a read of ``count`` registers from ``address``."""
+    try:
+        result = await read(address, count=count, slave=slave, priority=PRIORITY_SCAN, gap=gap)
+    except ModbusException:
+        return False
+    return not result.isError() and len(result.registers) >= count
+
+
+async def _measure_latency(read, slave, address):
+    """Measure the round trip of one register reads."""
+    samples = []
+    errors = 0
+    for _ in range(CALIBRATION_LATENCY_SAMPLES):
+        start = time.monotonic()
+        if await _accepts(read, slave, address, 1):
+            samples.append(time.monotonic() - start)
+        else:
+            errors += 1
+    figures = {"samples": len(samples), "errors": errors}
+    if samples:
+        samples.sort()
+        figures.update(
+            min=samples[0],
+            # A poll served in between only moves the upper figures
+            median=statistics.median(samples),
+            p95=samples[int(0.95 * (len(samples) - 1))],
+            max=samples[-1],
+        )
+    return figures
+
+
+async def _largest_block(read, slave, address):
+    """Bisect the largest register count the unit reads in one request from an address."""
+    if not await _accepts(read, slave, address, 1):
+        return 0
+    low, high = 1, DEFAULT_MAX_BLOCK
+    if await _accepts(read, slave, address, high):
+        return high
+    while high - low > 1:
+        middle = (low + high) // 2
+        if await _accepts(read, slave, address, middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+async def _measure_spans(read, slave, addresses):
+    """Return the spans covering the mapped addresses of one range, each readable in one request."""
+    spans = []
+    remaining = list(addresses)
+    while remaining:
+        first = remaining[0]
+        count = await _largest_block(read, slave, first)
+        if count:
+            spans.append([first, first + count - 1])
+        else:
+            _LOGGER.warning("Register %s does not answer a single register read", first)
+        # Mapped registers past the span, behind a hole in the range, start their own span
+        remaining = [address for address in remaining if address > first + max(count, 1) - 1]
+    return spans
+
+
+async def _measure_rates(read, slave, address):
+    """Send bursts of reads with shrinking gaps and count the failures of each burst."""
+    rates = []
+    for gap in CALIBRATION_RATE_GAPS:
+        # Each probe is spaced by its own gap, polling keeps the bus's gap meanwhile
+        errors = 0
+        start = time.monotonic()
+        for _ in range(CALIBRATION_RATE_BURST):
+            if not await _accepts(read, slave, address, 1, gap):
+                errors += 1
+        elapsed = time.monotonic() - start
+        rates.append({
+            "gap": gap,
+            "requests": CALIBRATION_RATE_BURST,
+            "errors": errors,
+            "rate": CALIBRATION_RATE_BURST / elapsed if elapsed else 0.0,
+        })
+    return rates
@@ -0,0 +1,86 @@
+import logging
+import socket
+
+from pymodbus.client import AsyncModbusSerialClient, AsyncModbusTcpClient
+from pymodbus.framer import Framer
+
+from .const import (
+    CONF_HOST,
+    CONF_TCP_PORT,
+    CONF_TRANSPORT,
+    DEFAULT_TCP_PORT,
+    DEFAULT_TIMEOUT,
+    RECONNECT_DELAY_MAX,
+    TCP_KEEPALIVE_COUNT,
+    TCP_KEEPALIVE_IDLE,
+    TCP_KEEPALIVE_INTERVAL,
+    TRANSPORT_RTU_OVER_TCP,
+    TRANSPORT_SERIAL,
+    TRANSPORT_TCP,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PersistentTcpClient(AsyncModbusTcpClient):
+    """Modbus TCP client that keeps one long-lived connection to a gateway.
+
+    TCP keepalive is enabled on every (re)connect so a gateway that silently
+    drops the connection is detected between polls, and pymodbus reconnects
+    in the background with a short back-off instead of on the next poll.
+    """
+
+    def callback_connected(self):
+        """Enable TCP keepalive on the freshly connected socket."""
+        super().callback_connected()
+        sock = self.transport.get_extra_info("socket") if self.transport else None
+        if sock is None:
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (
+            ("TCP_KEEPIDLE", TCP_KEEPALIVE_IDLE),
+            ("TCP_KEEPINTVL", TCP_KEEPALIVE_INTERVAL),
+            ("TCP_KEEPCNT", TCP_KEEPALIVE_COUNT),
+        ):
+            if hasattr(socket, option):  # Not every platform exposes the tuning options
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        _LOGGER.debug("Connected to Modbus gateway %s", self.comm_params.comm_name)
+
+
+def port_key(config_data):
+    """Return the identity of the physical bus a unit is attached to."""
+    transport = config_data.get(CONF_TRANSPORT, TRANSPORT_SERIAL)
+    if transport == TRANSPORT_SERIAL:
+        return config_data['port']
+    return f"{transport}://{config_data[CONF_HOST]}:{config_data.get(CONF_TCP_PORT, DEFAULT_TCP_PORT)}"
+
+
+def create_client(config_data):
+    """Create the pymodbus client for the configured transport.
+
+    Pymodbus retries are disabled, the bus applies an adaptive timeout to
+    every request and the coordinator spends its own retry budget.
+    """
+    transport = config_data.get(CONF_TRANSPORT, TRANSPORT_SERIAL)
+    if transport == TRANSPORT_SERIAL:
+        return AsyncModbusSerialClient(
+            port=config_data['port'],
+            framer=Framer.RTU,
+            baudrate=config_data['baudrate'],
+            parity=config_data['parity'],
+            stopbits=config_data['stopbits'],
+            timeout=DEFAULT_TIMEOUT,
+            retries=0,
+            reconnect_delay_max=RECONNECT_DELAY_MAX,
+        )
+    if transport in (TRANSPORT_TCP, TRANSPORT_RTU_OVER_TCP):
+        return PersistentTcpClient(
+            config_data[CONF_HOST],
+            port=config_data.get(CONF_TCP_PORT, DEFAULT_TCP_PORT),
+            # RTU over TCP tunnels the serial frames, CRC included, through the gateway
+            framer=Framer.SOCKET if transport == TRANSPORT_TCP else Framer.RTU,
+            timeout=DEFAULT_TIMEOUT,
+            retries=0,
+            reconnect_delay_max=RECONNECT_DELAY_MAX,
+        )
+    raise ValueError(f"Unsupported transport: {transport}")
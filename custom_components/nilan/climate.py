@@ -1,9 +1,10 @@
 import logging
+import os
 import voluptuous as vol
 from homeassistant.components.logbook import async_log_entry
 from pymodbus.exceptions import ModbusException
 from homeassistant.components.climate import ClimateEntity
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
 from homeassistant.components.climate.const import (
     ClimateEntityFeature,
     HVACMode,
@@ -11,18 +12,45 @@ from homeassistant.components.climate.const import (
 )
 from homeassistant.const import ATTR_TEMPERATURE, UnitOfTemperature
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv, entity_platform, service
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from .const import DOMAIN
+from homeassistant.util import dt as dt_util
+from .bus import PRIORITY_SCAN
+from .calibration import async_calibrate_bus, calibrated_spans, format_report
+from .const import CALIBRATION_DEADLINE, CONF_CALIBRATION, DEFAULT_MAX_BLOCK, DOMAIN, HOLDING, INPUT
+from .entity import NilanEntity
+from .modbus import async_scan_registers
+from .registers import AIR_EXCHANGE_MODES, RegisterMap
 
 _LOGGER = logging.getLogger(__name__)
 
 # Define service constants and schemas
 SERVICE_SET_AIR_EXCHANGE_MODE = "set_air_exchange_mode"
 SERVICE_SET_HOTWATER_SETPOINTS = "set_hotwater_setpoints"
+SERVICE_DUMP_SAMPLES = "dump_samples"
+SERVICE_SCAN_REGISTERS = "scan_registers"
+SERVICE_CALIBRATE_BUS = "calibrate_bus"
+
+DUMP_FORMAT_CSV = "csv"
+DUMP_FORMAT_BINARY = "binary"
+
+SCAN_TABLES = {INPUT: (INPUT,), HOLDING: (HOLDING,), "both": (INPUT, HOLDING)}
+# Covers the documented register map of the CTS602 controller
+SCAN_DEFAULT_END = 1999
+
+# Registers exposed through sensor_values
+SENSOR_KEYS = (
+    "intake_temperature",
+    "supply_temperature",
+    "room_exhaust_temperature",
+    "hot_water_top_temperature",
+    "hot_water_bottom_temperature",
+    "hot_water_anode",
+)
 
 SET_AIR_EXCHANGE_MODE_SCHEMA = cv.make_entity_service_schema({
-    vol.Required("mode"): vol.In(["Energy", "Comfort", "ComfortWater"]),
+    vol.Required("mode"): vol.In(list(AIR_EXCHANGE_MODES.values())),
 })
 
 SET_HOTWATER_SETPOINTS_SCHEMA = cv.make_entity_service_schema({
@@ -30,39 +58,69 @@ SET_HOTWATER_SETPOINTS_SCHEMA = cv.make_entity_service_schema({
     vol.Optional("bottom_temperature"): vol.Coerce(float),
 })
 
+DUMP_SAMPLES_SCHEMA = cv.make_entity_service_schema({
+    vol.Optional("format", default=DUMP_FORMAT_CSV): vol.In([DUMP_FORMAT_CSV, DUMP_FORMAT_BINARY]),
+})
+
+SCAN_REGISTERS_SCHEMA = cv.make_entity_service_schema({
+    vol.Optional("table", default="both"): vol.In(list(SCAN_TABLES)),
+    vol.Optional("start", default=0): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+    vol.Optional("end", default=SCAN_DEFAULT_END): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+    vol.Optional("max_block", default=DEFAULT_MAX_BLOCK): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=DEFAULT_MAX_BLOCK)
+    ),
+})
+
+CALIBRATE_BUS_SCHEMA = cv.make_entity_service_schema({})
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
     async_add_entities: AddEntitiesCallback
 ):
     """Set up Nilan climate platform from a config entry."""
-    climate_entity = NilanClimateEntity(hass)
-    async_add_entities([climate_entity], update_before_add=True)
+    climate_entity = NilanClimateEntity(hass, hass.data[DOMAIN][config_entry.entry_id]["coordinator"])
+    async_add_entities([climate_entity])
 
-    # Register service for setting air exchange mode as a domain service
-    hass.services.async_register(
-        DOMAIN,
+    # Entity services, so a call only reaches the targeted units
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
         SERVICE_SET_AIR_EXCHANGE_MODE,
-        climate_entity.async_handle_set_air_exchange_mode,
-        schema=SET_AIR_EXCHANGE_MODE_SCHEMA,
+        SET_AIR_EXCHANGE_MODE_SCHEMA,
+        NilanClimateEntity.async_handle_set_air_exchange_mode,
     )
-
-    # Register service for setting hot water setpoints as a domain service
-    hass.services.async_register(
-        DOMAIN,
+    platform.async_register_entity_service(
         SERVICE_SET_HOTWATER_SETPOINTS,
-        climate_entity.async_handle_set_hotwater_setpoints,
-        schema=SET_HOTWATER_SETPOINTS_SCHEMA,
+        SET_HOTWATER_SETPOINTS_SCHEMA,
+        NilanClimateEntity.async_handle_set_hotwater_setpoints,
+    )
+    platform.async_register_entity_service(
+        SERVICE_DUMP_SAMPLES,
+        DUMP_SAMPLES_SCHEMA,
+        "async_dump_samples",
+        supports_response=SupportsResponse.OPTIONAL,
     )
-class NilanClimateEntity(ClimateEntity):
+    platform.async_register_entity_service(
+        SERVICE_SCAN_REGISTERS,
+        SCAN_REGISTERS_SCHEMA,
+        "async_scan_registers",
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    platform.async_register_entity_service(
+        SERVICE_CALIBRATE_BUS,
+        CALIBRATE_BUS_SCHEMA,
+        "async_calibrate_bus",
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+class NilanClimateEntity(NilanEntity, ClimateEntity):
     """Representation of a Nilan Climate control."""
 
-    def __init__(self, hass: HomeAssistant):
+    def __init__(self, hass: HomeAssistant, coordinator):
         """Initialize the climate entity."""
+        super().__init__(coordinator, "climate_control")
         self.hass = hass
-        self.client = hass.data.get(DOMAIN).get("modbus_client")
-        self._slave = hass.data.get(DOMAIN).get("slave")
-        self._attr_unique_id = "nilan_climate_control"
+        self.client = coordinator.client
+        self._slave = coordinator.slave
         self.target_temperature_step = 1.0
         self._attr_temperature_unit = UnitOfTemperature.CELSIUS
         self._attr_supported_features = (
@@ -84,24 +142,21 @@ class NilanClimateEntity(ClimateEntity):
         self.bottom_temperature_setpoint = None
         self.cooling_setpoint = None
         self.sensor_values = {}
+        self._register_map = coordinator.register_map
+        self._values = {}
         self._attr_fan_mode = None
-        self._attr_fan_modes = ["off", "min", "normal-low", "normal-high", "high"]
-        self._slave = 30
+        self._attr_fan_modes = self._register_map.options("fan_mode")
         self._attr_hvac_modes = [HVACMode.HEAT, HVACMode.COOL, HVACMode.HEAT_COOL]
         self._attr_hvac_mode = None
         self._hvac_action = HVACAction.OFF
+        self._attributes = self._build_attributes()
         _LOGGER.info("Nilan Climate Control initialized")
 
     async def async_added_to_hass(self):
         """Run when the entity is added to Home Assistant."""
-        if not self.client:
-            _LOGGER.error("Modbus client not found.")
-            return
-
-        try:
-            await self._read_hotwater_setpoints()
-        except Exception as e:
-            _LOGGER.error(f"Failed to read hot water setpoints: {e}")
+        await super().async_added_to_hass()
+        if self.coordinator.data is not None:
+            self._apply_snapshot(self.coordinator.data)
 
     @property
     def name(self):
@@ -118,9 +173,12 @@ class NilanClimateEntity(ClimateEntity):
             | ClimateEntityFeature.TURN_OFF
         )
 
-    @property
-    def extra_state_attributes(self):
-        """Return the state attributes."""
+    def _state_attributes(self):
+        """Return the state attributes cached at the last change."""
+        return self._attributes
+
+    def _build_attributes(self):
+        """Build the state attributes from the decoded values."""
         attributes = {
             "current_humidity": self.current_humidity,
             "target_temperature": self.target_temperature,
@@ -136,322 +194,216 @@ class NilanClimateEntity(ClimateEntity):
             "days_to_filter_change": self.days_to_filter_change,
             "alarm_status": self.alarm_status,
             "ventilation_state": self.ventilation_state,
-            "air exchange mode": self.map_air_exch_mode(self.air_exch_mode),
+            "air exchange mode": self.air_exch_mode,
             "Boiler top temperature setpoint": self.top_temperature_setpoint,
             "Boiler bottom temperature setpoint": self.bottom_temperature_setpoint,
-            "cooling_setpoint": self.map_cooling_setpoint(self.cooling_setpoint),
+            "cooling_setpoint": self.cooling_setpoint,
         }
         attributes.update(self.sensor_values)
         return attributes
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        if self.client is None:
-            _LOGGER.error("Modbus client not found.")
-            return
-
-        try:
-            await self._read_hvac_mode()
-            await self._read_hvac_action()
-            await self._read_temperature_humidity()
-            await self._read_fan_speeds()
-            await self._read_capacities()
-            await self._read_filter_data()
-            await self._read_alarm_status()
-            await self._read_ventilation_state()
-            await self._read_sensor_values()
-            await self._read_hotwater_setpoints()
-            await self._read_cooling_setpoint()
-            await self._read_air_exchange_mode()
-            await self.async_get_fan_mode()
-            await self.async_log_hvac_status()
-        except ModbusException as e:
-            _LOGGER.error("Error communicating with Nilan device: %s", e)
-
-    async def _read_hvac_mode(self):
+    def _apply_snapshot(self, values):
+        """Decode a coordinator snapshot into entity state and report if it changed."""
+        self._values = values
+        self._read_hvac_mode()
+        self._read_hvac_action()
+        self._read_temperature_humidity()
+        self._read_fan_speeds()
+        self._read_capacities()
+        self._read_filter_data()
+        self._read_alarm_status()
+        self._read_ventilation_state()
+        self._read_sensor_values()
+        self._read_hotwater_setpoints()
+        self._read_cooling_setpoint()
+        self._read_air_exchange_mode()
+        self._read_fan_mode()
+        self._log_hvac_status()
+        attributes = self._build_attributes()
+        if attributes == self._attributes:
+            return False
+        self._attributes = attributes
+        return True
+
+    def _read_hvac_mode(self):
         """Read HVAC mode."""
-        result = await self.client.read_holding_registers(1002, count=1, slave=self._slave)
-        if not result.isError() and result.registers:
-            hvac_mode = {
-                1: HVACMode.HEAT,
-                2: HVACMode.COOL,
-                3: HVACMode.HEAT_COOL,
-            }.get(result.registers[0], HVACMode.OFF)  # Default to HVACMode.OFF if value is unknown
+        hvac_mode = self._values.get("hvac_mode")
+        if hvac_mode is not None:
             self._attr_hvac_mode = hvac_mode
-            _LOGGER.info(f"HVAC mode: {hvac_mode}")
-        else:
-            _LOGGER.warning("Unexpected value or error in reading HVAC mode")
+            _LOGGER.debug("HVAC mode: %s", hvac_mode)
 
     async def async_set_hvac_mode(self, hvac_mode):
         """Set new target HVAC mode."""
-        try:
-            register_value = {
-                HVACMode.HEAT: 1,
-                HVACMode.COOL: 2,
-                HVACMode.HEAT_COOL: 3,
-            }.get(hvac_mode, 0)  # Default to 0 if the hvac_mode is not recognized
-
-            result = await self.client.write_registers(1002, [register_value], slave=self._slave)
-            if not result.isError():
-                self._attr_hvac_mode = hvac_mode
-                self.schedule_update_ha_state()
-                _LOGGER.info(f"HVAC mode set to {hvac_mode}")
-            else:
-                _LOGGER.warning("Failed to set HVAC mode.")
-        except ModbusException as e:
-            _LOGGER.error("Error setting HVAC mode: %s", e)
+        if self._register_map.encode("hvac_mode", hvac_mode) is None:
+            _LOGGER.error("Invalid HVAC mode: %s", hvac_mode)
+            return
+        if await self.coordinator.async_write_values({"hvac_mode": hvac_mode}):
+            _LOGGER.info("HVAC mode set to %s", hvac_mode)
+        else:
+            _LOGGER.warning("Failed to set HVAC mode.")
 
-    async def _read_hvac_action(self):
+    def _read_hvac_action(self):
         """Read and update the HVAC action."""
-        result = await self.client.read_input_registers(1002, count=1, slave=self._slave)
-        if not result.isError():
-            hvac_action_value = result.registers[0]
-            new_hvac_action = self.map_hvac_action(hvac_action_value)
+        new_hvac_action = self._values.get("hvac_action")
+        if new_hvac_action is not None:
             if new_hvac_action != self._hvac_action:
                 self._hvac_action = new_hvac_action
                 if self._hvac_action is not None:
                     async_log_entry(self.hass, "Nilan Climate Control", f"HVAC action changed to {self._hvac_action}")
-                _LOGGER.info(f"HVAC action: {self._hvac_action}")
-        else:
-            _LOGGER.error("Error reading Nilan HVAC action")
-
-    def map_hvac_action(self, value):
-        """Map the HVAC action value from the control state."""
-        hvac_action_map = {
-            0: HVACAction.OFF,
-            1: "Shifting",
-            2: "Stopping",
-            3: "Start",
-            4: "Standby",
-            5: "Ventilation stop",
-            6: HVACAction.FAN,
-            7: HVACAction.HEATING,
-            8: HVACAction.COOLING,
-            9: "Hotwater",
-            10: "Legionella",
-            11: "Cooling and Hotwater",
-            12: "Central heating",
-            13: "Defrost",
-            14: "Frost secure",
-            15: "Dervice",
-            16: "Alarm",
-            17: "Heating hotwater",
-        }
-        return hvac_action_map.get(value, HVACAction.OFF)
+                _LOGGER.debug("HVAC action: %s", self._hvac_action)
 
-    async def _read_temperature_humidity(self):
+    def _read_temperature_humidity(self):
         """Read temperature and humidity related values."""
         # Get set temperature
-        result = await self.client.read_holding_registers(1004, count=1, slave=self._slave)
-        if not result.isError():
-            self.target_temperature = result.registers[0] * 0.01
-            _LOGGER.info(f"Target temperature: {self.target_temperature} °C")
+        value = self._values.get("target_temperature")
+        if value is not None:
+            self.target_temperature = value
+            _LOGGER.debug("Target temperature: %s °C", self.target_temperature)
 
         # Get actual temperature
-        result = await self.client.read_input_registers(1202, count=1, slave=self._slave)
-        if not result.isError():
-            self.current_temperature = result.registers[0] * 0.01
-            _LOGGER.info(f"Current temperature: {self.current_temperature} °C")
+        value = self._values.get("current_temperature")
+        if value is not None:
+            self.current_temperature = value
+            _LOGGER.debug("Current temperature: %s °C", self.current_temperature)
 
         # Get actual humidity
-        result = await self.client.read_input_registers(221, count=1, slave=self._slave)
-        if not result.isError():
-            self.current_humidity = result.registers[0] * 0.01
-            _LOGGER.info(f"Current humidity: {self.current_humidity} %")
+        value = self._values.get("current_humidity")
+        if value is not None:
+            self.current_humidity = value
+            _LOGGER.debug("Current humidity: %s %%", self.current_humidity)
 
-    async def _read_fan_speeds(self):
+    def _read_fan_speeds(self):
         """Read fan speed related values."""
         # Get inlet fan speed
-        result = await self.client.read_input_registers(1101, count=1, slave=self._slave)
-        if not result.isError():
-            self.inlet_fan_speed = result.registers[0]
-            _LOGGER.info(f"Inlet fan speed: {self.inlet_fan_speed}")
+        value = self._values.get("inlet_fan_speed")
+        if value is not None:
+            self.inlet_fan_speed = value
+            _LOGGER.debug("Inlet fan speed: %s", self.inlet_fan_speed)
 
         # Get exhaust fan speed
-        result = await self.client.read_input_registers(1102, count=1, slave=self._slave)
-        if not result.isError():
-            self.exhaust_fan_speed = result.registers[0]
-            _LOGGER.info(f"Exhaust fan speed: {self.exhaust_fan_speed}")
+        value = self._values.get("exhaust_fan_speed")
+        if value is not None:
+            self.exhaust_fan_speed = value
+            _LOGGER.debug("Exhaust fan speed: %s", self.exhaust_fan_speed)
 
-    async def _read_capacities(self):
+    def _read_capacities(self):
         """Read capacity related values."""
         # Get requested capacity
-        result = await self.client.read_input_registers(1205, count=1, slave=self._slave)
-        if not result.isError():
-            self.requested_capacity = result.registers[0] * 0.01
-            _LOGGER.info(f"Requested capacity: {self.requested_capacity}")
+        value = self._values.get("requested_capacity")
+        if value is not None:
+            self.requested_capacity = value
+            _LOGGER.debug("Requested capacity: %s", self.requested_capacity)
 
         # Get actual capacity
-        result = await self.client.read_input_registers(1206, count=1, slave=self._slave)
-        if not result.isError():
-            self.actual_capacity = result.registers[0] * 0.01
-            _LOGGER.info(f"Actual capacity: {self.actual_capacity}")
+        value = self._values.get("actual_capacity")
+        if value is not None:
+            self.actual_capacity = value
+            _LOGGER.debug("Actual capacity: %s", self.actual_capacity)
 
-    async def _read_filter_data(self):
+    def _read_filter_data(self):
         """Read filter related data."""
         # Get days since last filter change
-        result = await self.client.read_input_registers(1103, count=1, slave=self._slave)
-        if not result.isError():
-            self.days_since_filter_change = result.registers[0]
-            _LOGGER.info(f"Days since filter change: {self.days_since_filter_change}")
+        value = self._values.get("days_since_filter_change")
+        if value is not None:
+            self.days_since_filter_change = value
+            _LOGGER.debug("Days since filter change: %s", self.days_since_filter_change)
 
         # Get days to next filter change
-        result = await self.client.read_input_registers(1104, count=1, slave=self._slave)
-        if not result.isError():
-            self.days_to_filter_change = result.registers[0]
-            _LOGGER.info(f"Days to next filter change: {self.days_to_filter_change}")
+        value = self._values.get("days_to_filter_change")
+        if value is not None:
+            self.days_to_filter_change = value
+            _LOGGER.debug("Days to next filter change: %s", self.days_to_filter_change)
 
-    async def _read_alarm_status(self):
+    def _read_alarm_status(self):
         """Read alarm status."""
-        result = await self.client.read_input_registers(400, count=1, slave=self._slave)
-        if not result.isError():
-            new_alarm_status = result.registers[0]
+        new_alarm_status = self._values.get("alarm_status")
+        if new_alarm_status is not None:
             if new_alarm_status != self.alarm_status:
                 self.alarm_status = new_alarm_status
                 async_log_entry(self.hass, "Nilan Climate Control", f"Alarm status changed to {self.alarm_status}")
-                _LOGGER.info(f"Alarm status: {self.alarm_status}")
-        else:
-            _LOGGER.error("Error reading alarm status")
+                _LOGGER.debug("Alarm status: %s", self.alarm_status)
 
-    async def _read_ventilation_state(self):
+    def _read_ventilation_state(self):
         """Read ventilation state."""
-        result = await self.client.read_input_registers(3102, count=1, slave=self._slave)
-        if not result.isError():
-            self.ventilation_state = result.registers[0]
-            _LOGGER.info(f"Ventilation state: {self.ventilation_state}")
+        value = self._values.get("ventilation_state")
+        if value is not None:
+            self.ventilation_state = value
+            _LOGGER.debug("Ventilation state: %s", self.ventilation_state)
 
-    async def _read_sensor_values(self):
+    def _read_sensor_values(self):
         """Read additional sensor values."""
-        sensors = {
-            "intake_temperature": [201, 0.01],
-            "room_exhaust_temperature": [204, 0.01],
-            "hot_water_top_temperature": [211, 0.01],
-            "hot_water_bottom_temperature": [212, 0.01],
-            "hot_water_anode": [216, 0.01],
-        }
-        for sensor, params in sensors.items():
-            result = await self.client.read_input_registers(params[0], count=1, slave=self._slave)
-            if not result.isError():
-                self.sensor_values[sensor] = result.registers[0] * params[1]
-                _LOGGER.info(f"{sensor.replace('_', ' ').title()}: {self.sensor_values[sensor]}")
+        for sensor in SENSOR_KEYS:
+            value = self._values.get(sensor)
+            if value is not None:
+                self.sensor_values[sensor] = value
+                _LOGGER.debug("%s: %s", sensor, value)
 
-    async def _read_air_exchange_mode(self):
+    def _read_air_exchange_mode(self):
         """Read air exchange mode."""
-        result = await self.client.read_holding_registers(1100, count=1, slave=self._slave)
-        if not result.isError():
-            self.air_exch_mode = result.registers[0]
-            _LOGGER.info(f"Air exchange mode: {self.map_air_exch_mode(self.air_exch_mode)}")
+        value = self._values.get("air_exch_mode")
+        if value is not None:
+            self.air_exch_mode = value
+            _LOGGER.debug("Air exchange mode: %s", self.air_exch_mode)
 
     async def async_set_air_exchange_mode(self, mode):
         """Set air exchange mode."""
-        try:
-            # Convert the mode to the corresponding register value
-            mode_value = {
-                "Energy": 0,
-                "Comfort": 1,
-                "ComfortWater": 2  # Corrected here
-            }.get(mode)
-
-            if mode_value is not None:
-                result = await self.client.write_registers(1100, [mode_value], slave=self._slave)
-                if not result.isError():
-                    self.air_exch_mode = mode_value
-                    self.schedule_update_ha_state()
-                    _LOGGER.info(f"Air exchange mode set to {mode}")
-                else:
-                    _LOGGER.warning("Failed to set air exchange mode.")
-            else:
-                _LOGGER.error(f"Invalid air exchange mode: {mode}")
-        except ModbusException as e:
-            _LOGGER.error("Error setting air exchange mode: %s", e)
-
-    def map_air_exch_mode(self, value):
-        """Map air exchange mode values."""
-        air_exch_map = {
-            0: "Energy",
-            1: "Comfort",
-            2: "ComfortWater",
-        }
-        return air_exch_map.get(value, "Unknown")
+        if self._register_map.encode("air_exch_mode", mode) is None:
+            _LOGGER.error("Invalid air exchange mode: %s", mode)
+            return
+        if await self.coordinator.async_write_values({"air_exch_mode": mode}):
+            _LOGGER.info("Air exchange mode set to %s", mode)
+        else:
+            _LOGGER.warning("Failed to set air exchange mode.")
 
-    async def _read_cooling_setpoint(self):
+    def _read_cooling_setpoint(self):
         """Read cooling setpoint."""
-        result = await self.client.read_holding_registers(1200, count=1, slave=self._slave)
-        if not result.isError():
-            self.cooling_setpoint = result.registers[0]
-            _LOGGER.info(f"Cooling setpoint: {self.cooling_setpoint} ({self.map_cooling_setpoint(self.cooling_setpoint)})")
+        value = self._values.get("cooling_setpoint")
+        if value is not None:
+            self.cooling_setpoint = value
+            _LOGGER.debug("Cooling setpoint: %s", self.cooling_setpoint)
 
     async def async_set_cooling_setpoint(self, setpoint):
         """Set cooling temperature setpoint."""
-        try:
-            result = await self.client.write_registers(1200, [setpoint], slave=self._slave)
-            if not result.isError():
-                self.cooling_setpoint = setpoint
-                self.schedule_update_ha_state()
-                _LOGGER.info(f"Cooling setpoint set to {self.map_cooling_setpoint(setpoint)}")
-        except ModbusException as e:
-            _LOGGER.error("Error setting cooling setpoint: %s", e)
-
-    def map_cooling_setpoint(self, value):
-        """Map cooling setpoint values."""
-        cooling_set_map = {
-            0: "Off",
-            1: "Set + 0 °C",
-            2: "Set + 1 °C",
-            3: "Set + 2 °C",
-            4: "Set + 3 °C",
-            5: "Set + 4 °C",
-            6: "Set + 5 °C",
-            7: "Set + 7 °C",
-            8: "Set + 10 °C",
-        }
-        return cooling_set_map.get(value, "Unknown")
-
-    async def _read_hotwater_setpoints(self):
-        """Read hot water setpoints from the Nilan device."""
-        if not self.client:
-            _LOGGER.error("Modbus client not initialized.")
+        label = self._register_map.label("cooling_setpoint", setpoint)
+        if self._register_map.encode("cooling_setpoint", label) != setpoint:
+            _LOGGER.error("Invalid cooling setpoint: %s", setpoint)
             return
-
-        result = await self.client.read_holding_registers(1700, count=1, slave=self._slave)
-        if result.isError():
-            _LOGGER.error("Failed to read top boiler temperature.")
+        if await self.coordinator.async_write_values({"cooling_setpoint": label}):
+            _LOGGER.info("Cooling setpoint set to %s", label)
         else:
-            self.top_temperature_setpoint = result.registers[0] * 0.01
-            _LOGGER.info(f"Top boiler temperature setpoint: {self.top_temperature_setpoint} °C")
+            _LOGGER.warning("Failed to set cooling setpoint.")
 
-        result = await self.client.read_holding_registers(1701, count=1, slave=self._slave)
-        if result.isError():
-            _LOGGER.error("Failed to read bottom boiler temperature.")
-        else:
-            self.bottom_temperature_setpoint = result.registers[0] * 0.01
-            _LOGGER.info(f"Bottom boiler temperature setpoint: {self.bottom_temperature_setpoint} °C")
+    def _read_hotwater_setpoints(self):
+        """Read hot water setpoints from the Nilan device."""
+        # A setpoint not read yet stays unknown, failed reads are logged by the bus cycle
+        value = self._values.get("top_temperature_setpoint")
+        if value is not None:
+            self.top_temperature_setpoint = value
+            _LOGGER.debug("Top boiler temperature setpoint: %s °C", self.top_temperature_setpoint)
+
+        value = self._values.get("bottom_temperature_setpoint")
+        if value is not None:
+            self.bottom_temperature_setpoint = value
+            _LOGGER.debug("Bottom boiler temperature setpoint: %s °C", self.bottom_temperature_setpoint)
 
     async def async_set_hotwater_setpoints(self, top_temperature=None, bottom_temperature=None):
         """Set hot water setpoints for the boiler."""
-        try:
-            if top_temperature is not None:
-                top_value = int(top_temperature * 100)  # Convert to Modbus format
-                result = await self.client.write_registers(1700, [top_value], slave=self._slave)
-                if not result.isError():
-                    self.top_temperature_setpoint = top_temperature
-                    _LOGGER.info(f"Boiler top temperature setpoint set to {top_temperature} °C")
-                else:
-                    _LOGGER.warning("Failed to set Boiler top temperature setpoint.")
-
-            if bottom_temperature is not None:
-                bottom_value = int(bottom_temperature * 100)  # Convert to Modbus format
-                result = await self.client.write_registers(1701, [bottom_value], slave=self._slave)
-                if not result.isError():
-                    self.bottom_temperature_setpoint = bottom_temperature
-                    _LOGGER.info(f"Boiler bottom temperature setpoint set to {bottom_temperature} °C")
-                else:
-                    _LOGGER.warning("Failed to set Boiler bottom temperature setpoint.")
-
-            self.schedule_update_ha_state()
+        setpoints = {}
+        if top_temperature is not None:
+            setpoints["top_temperature_setpoint"] = top_temperature
+        if bottom_temperature is not None:
+            setpoints["bottom_temperature_setpoint"] = bottom_temperature
 
-        except ModbusException as e:
-            _LOGGER.error("Error setting hot water setpoints: %s", e)
+        # Both writes are queued together so the bus sends them as one multi-register write
+        try:
+            accepted = await self.coordinator.async_write_values(setpoints)
+        except ValueError as e:
+            raise HomeAssistantError(f"Cannot set hot water setpoints: {e}") from e
+        if accepted:
+            _LOGGER.info("Hot water setpoints set to %s", setpoints)
+        else:
+            # Only the setpoints the unit did not take were rolled back
+            _LOGGER.warning("Failed to set hot water setpoints %s.", setpoints)
 
     async def async_set_temperature(self, **kwargs):
         """Set new target temperature."""
@@ -460,66 +412,111 @@ class NilanClimateEntity(ClimateEntity):
             _LOGGER.error("No temperature provided to set_temperature")
             return
         try:
-            register_value = int(temperature / 0.01)
-            result = await self.client.write_registers(1004, [register_value], slave=self._slave)
-            if not result.isError():
-                self.target_temperature = temperature
-                self.schedule_update_ha_state()
-        except ModbusException as e:
-            _LOGGER.error("Error communicating with Nilan device: %s", e)
+            accepted = await self.coordinator.async_write_values({"target_temperature": temperature})
+        except ValueError as e:
+            raise HomeAssistantError(f"Cannot set target temperature: {e}") from e
+        if not accepted:
+            _LOGGER.warning("Failed to set target temperature.")
 
     async def async_set_fan_mode(self, fan_mode):
         """Set new target fan mode."""
-        try:
-            register_value = {
-                "off": 0,
-                "min": 1,
-                "normal-low": 2,
-                "normal-high": 3,
-                "high": 4,
-            }.get(fan_mode)
-
-            if register_value is not None:
-                result = await self.client.write_registers(1003, [register_value], slave=self._slave)
-                if not result.isError():
-                    self._attr_fan_mode = fan_mode
-                    self.schedule_update_ha_state()
-                    _LOGGER.info(f"Fan mode set to {fan_mode}")
-            else:
-                _LOGGER.error(f"Invalid fan mode: {fan_mode}")
-        except ModbusException as e:
-            _LOGGER.error("Error setting fan mode: %s", e)
+        if self._register_map.encode("fan_mode", fan_mode) is None:
+            _LOGGER.error("Invalid fan mode: %s", fan_mode)
+            return
+        if await self.coordinator.async_write_values({"fan_mode": fan_mode}):
+            _LOGGER.info("Fan mode set to %s", fan_mode)
+        else:
+            _LOGGER.warning("Failed to set fan mode.")
 
-    async def async_get_fan_mode(self):
+    def _read_fan_mode(self):
         """Read and update the fan mode."""
-        result = await self.client.read_holding_registers(1003, count=1, slave=self._slave)
-        if not result.isError():
-            fan_mode_value = result.registers[0]
-            new_fan_mode = {
-                0: "off",
-                1: "min",
-                2: "normal-low",
-                3: "normal-high",
-                4: "high",
-            }.get(fan_mode_value)
+        if "fan_mode" in self._values:
+            new_fan_mode = self._values["fan_mode"]
             if new_fan_mode != self._attr_fan_mode:
                 self._attr_fan_mode = new_fan_mode
-                _LOGGER.info(f"Fan mode updated to: {self._attr_fan_mode}")
-        else:
-            _LOGGER.error("Error reading fan mode")
+                _LOGGER.debug("Fan mode updated to: %s", self._attr_fan_mode)
 
-    async def async_log_hvac_status(self):
+    def _log_hvac_status(self):
         """Log the status of the HVAC system and hot water temperatures."""
-        _LOGGER.info(f"HVAC Mode: {self._attr_hvac_mode}, HVAC Action: {self._hvac_action}")
-        _LOGGER.info(f"Top Hot Water Temperature: {self.top_temperature_setpoint} °C, Bottom Hot Water Temperature: {self.bottom_temperature_setpoint} °C")
+        _LOGGER.debug("HVAC Mode: %s, HVAC Action: %s", self._attr_hvac_mode, self._hvac_action)
+        _LOGGER.debug("Top Hot Water Temperature: %s °C, Bottom Hot Water Temperature: %s °C", self.top_temperature_setpoint, self.bottom_temperature_setpoint)
+
+    async def async_dump_samples(self, format=DUMP_FORMAT_CSV):
+        """Write the raw sample buffers to a file in the configuration directory."""
+        samples = self.coordinator.samples
+        if samples is None:
+            raise HomeAssistantError("Sample buffers are disabled in the integration options")
+        if format == DUMP_FORMAT_CSV:
+            content, extension = samples.to_csv().encode(), "csv"
+        else:
+            content, extension = samples.to_binary(), "bin"
+        path = self.hass.config.path(
+            DOMAIN, f"samples_{self._slave}_{dt_util.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        )
+        await self.hass.async_add_executor_job(_write_file, path, content)
+        _LOGGER.info("Sample buffers written to %s", path)
+        return {"path": path, "samples": {key: len(buffer) for key, buffer in samples.buffers.items()}}
+
+    async def async_scan_registers(self, table="both", start=0, end=SCAN_DEFAULT_END, max_block=DEFAULT_MAX_BLOCK):
+        """Read every supported register in a range and stream the values to a CSV file.
+
+        The scan runs at the lowest bus priority, so polling and writes are
+        served between two of its requests.
+        """
+        if end < start:
+            raise HomeAssistantError("The scan end address must not be below the start address")
+        path = self.hass.config.path(DOMAIN, f"scan_{self._slave}_{dt_util.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        file = await self.hass.async_add_executor_job(_open_file, path)
+        counts = {}
+        try:
+            await self.hass.async_add_executor_job(file.write, "table,address,value\n")
+            for scanned in SCAN_TABLES[table]:
+                counts[scanned] = 0
+                async for address, values in async_scan_registers(
+                    self.client, self._slave, scanned, start, end, max_block, priority=PRIORITY_SCAN
+                ):
+                    rows = "".join(f"{scanned},{address + offset},{value}\n" for offset, value in enumerate(values))
+                    await self.hass.async_add_executor_job(file.write, rows)
+                    counts[scanned] += len(values)
+        except ModbusException as e:
+            raise HomeAssistantError(f"Register scan stopped, partial result in {path}: {e}") from e
+        finally:
+            await self.hass.async_add_executor_job(file.close)
+        _LOGGER.info("Register scan written to %s", path)
+        return {"path": path, "registers": counts}
+
+    async def async_calibrate_bus(self):
+        """Measure the bus parameters of the unit, store them in the entry and write a report.
+
+        Storing the calibration reloads the entry, which applies it to the
+        read plan, the request gap and the timeouts.
+        """
+        register_map = self._register_map
+        try:
+            calibration = await async_calibrate_bus(self.client, self._slave, register_map)
+        except TimeoutError as e:
+            raise HomeAssistantError(f"Bus calibration did not finish within {CALIBRATION_DEADLINE} s") from e
+        except ModbusException as e:
+            raise HomeAssistantError(f"Bus calibration failed: {e}") from e
+        calibration["date"] = dt_util.now().isoformat()
+        calibrated_map = RegisterMap(
+            register_map.model, register_map.max_gap, register_map.max_block, calibrated_spans(calibration)
+        )
+        entry = self.coordinator.config_entry
+        report = format_report(calibration, entry.title, register_map.read_plan, calibrated_map.read_plan)
+        path = self.hass.config.path(DOMAIN, f"calibration_{self._slave}_{dt_util.now().strftime('%Y%m%d_%H%M%S')}.txt")
+        await self.hass.async_add_executor_job(_write_file, path, report.encode())
+        _LOGGER.info("Bus calibration report written to %s", path)
+        self.hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_CALIBRATION: calibration})
+        return {"path": path, "calibration": calibration}
 
     async def async_handle_set_air_exchange_mode(self, call: ServiceCall):
         """Handle the service call to set air exchange mode."""
         mode = call.data.get("mode")
-        if mode in ["Energy", "Comfort", "ComfortWater"]:
+        if mode in self._register_map.options("air_exch_mode"):
             await self.async_set_air_exchange_mode(mode)
         else:
-            _LOGGER.error(f"Invalid air exchange mode provided: {mode}")
+            _LOGGER.error("Invalid air exchange mode provided: %s", mode)
 
     async def async_handle_set_hotwater_setpoints(self, call):
         """Handle the service call to set hot water setpoints."""
@@ -532,3 +529,15 @@ class NilanClimateEntity(ClimateEntity):
             )
         else:
             _LOGGER.error("Invalid temperatures provided for hot water setpoints")
+
+
+def _write_file(path, content):
+    """Write a dump file, creating its directory on first use."""
+    with _open_file(path, "wb") as file:
+        file.write(content)
+
+
+def _open_file(path, mode="w"):
+    """Open a dump file for writing, creating its directory on first use."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, mode)
@@ -1,24 +1,219 @@
 import voluptuous as vol
 from homeassistant import config_entries
-from .const import DOMAIN
+from homeassistant.core import callback
+from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_ALARM_INTERVAL,
+    CONF_COLLECT_METRICS,
+    CONF_FAST_INTERVAL,
+    CONF_HOST,
+    CONF_MAX_BLOCK,
+    CONF_MAX_GAP,
+    CONF_MODEL,
+    CONF_NORMAL_INTERVAL,
+    CONF_PERCENTAGE_DEADBAND,
+    CONF_PIPELINE_DEPTH,
+    CONF_PROXY_HOST,
+    CONF_PROXY_MAX_AGE,
+    CONF_PROXY_PORT,
+    CONF_PROXY_WRITES,
+    CONF_SAMPLE_CAPACITY,
+    CONF_SLOW_INTERVAL,
+    CONF_STATISTICS_WINDOW,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_TCP_PORT,
+    CONF_TRACE,
+    CONF_TRANSPORT,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_ALARM_INTERVAL,
+    DEFAULT_COLLECT_METRICS,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_MAX_BLOCK,
+    DEFAULT_MAX_GAP,
+    DEFAULT_MODEL,
+    DEFAULT_NORMAL_INTERVAL,
+    DEFAULT_PERCENTAGE_DEADBAND,
+    DEFAULT_PIPELINE_DEPTH,
+    DEFAULT_PROXY_HOST,
+    DEFAULT_PROXY_MAX_AGE,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_PROXY_WRITES,
+    DEFAULT_SAMPLE_CAPACITY,
+    DEFAULT_SLOW_INTERVAL,
+    DEFAULT_STATISTICS_WINDOW,
+    DEFAULT_TEMPERATURE_DEADBAND,
+    DEFAULT_TCP_PORT,
+    DEFAULT_TRACE,
+    DOMAIN,
+    MAX_PIPELINE_DEPTH,
+    TRANSPORT_SERIAL,
+    TRANSPORT_TCP,
+    TRANSPORTS,
+)
+from .client import port_key
+from .registers import MODELS
+
+# Fields shared by all transports
+_COMMON_SCHEMA = {
+    vol.Required("slave", default=30): int,
+    vol.Optional(CONF_MAX_GAP, default=DEFAULT_MAX_GAP): vol.All(int, vol.Range(min=0, max=124)),  # Unused registers allowed in a block read
+    vol.Optional(CONF_MAX_BLOCK, default=DEFAULT_MAX_BLOCK): vol.All(int, vol.Range(min=1, max=125)),  # Registers per block read
+}
 
 class NilanConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Nilan configuration flow."""
     VERSION = 1
 
+    def __init__(self):
+        """Initialize the configuration flow."""
+        self._transport = TRANSPORT_SERIAL
+
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
         if user_input is not None:
-            return self.async_create_entry(title="Nilan Climate Control", data=user_input)
+            self._transport = user_input[CONF_TRANSPORT]
+            if self._transport == TRANSPORT_SERIAL:
+                return await self.async_step_serial()
+            return await self.async_step_tcp()
 
-        # Show the form to input the Modbus configuration
+        # Show the form to choose how the unit is connected
         return self.async_show_form(
             step_id="user",
             data_schema=vol.Schema({
+                vol.Required(CONF_TRANSPORT, default=TRANSPORT_SERIAL): vol.In(list(TRANSPORTS)),
+            })
+        )
+
+    async def async_step_serial(self, user_input=None):
+        """Configure a unit on a local RS485 serial port."""
+        if user_input is not None:
+            return await self._async_create_entry(user_input)
+
+        # Show the form to input the Modbus configuration
+        return self.async_show_form(
+            step_id="serial",
+            data_schema=vol.Schema({
+                vol.Required(CONF_MODEL, default=DEFAULT_MODEL): vol.In(list(MODELS)),  # Nilan model
                 vol.Required("port", default="/dev/ttyUSB0"): str,  # Modbus serial port
                 vol.Required("baudrate", default=19200): int,
                 vol.Required("parity", default="E"): vol.In(["N", "E", "O"]),  # Parity
                 vol.Required("stopbits", default=1): vol.Coerce(int),
-                vol.Required("slave", default=30): int,
+                **_COMMON_SCHEMA,
+            })
+        )
+
+    async def async_step_tcp(self, user_input=None):
+        """Configure a unit behind a Modbus TCP or RTU-over-TCP gateway."""
+        if user_input is not None:
+            return await self._async_create_entry(user_input)
+
+        return self.async_show_form(
+            step_id="tcp",
+            data_schema=vol.Schema({
+                vol.Required(CONF_MODEL, default=DEFAULT_MODEL): vol.In(list(MODELS)),  # Nilan model
+                vol.Required(CONF_HOST): str,  # Gateway host name or IP address
+                vol.Required(CONF_TCP_PORT, default=DEFAULT_TCP_PORT): vol.All(int, vol.Range(min=1, max=65535)),
+                **_COMMON_SCHEMA,
             })
         )
+
+    async def _async_create_entry(self, user_input):
+        """Create the config entry for the chosen transport."""
+        data = {CONF_TRANSPORT: self._transport, **user_input}
+        # A unit is identified by its port and slave address
+        await self.async_set_unique_id(f"{port_key(data)}_{data['slave']}")
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(
+            title=f"Nilan Climate Control {data['slave']}",
+            data=data,
+        )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow handler."""
+        return NilanOptionsFlow(config_entry)
+
+
+class NilanOptionsFlow(config_entries.OptionsFlow):
+    """Nilan options flow for the polling intervals and deadbands."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the polling intervals and deadbands."""
+        if user_input is not None:
+            if not user_input[CONF_FAST_INTERVAL] <= user_input[CONF_NORMAL_INTERVAL] <= user_input[CONF_SLOW_INTERVAL]:
+                return self._show_form(user_input, {"base": "interval_order"})
+            return self.async_create_entry(title="", data=user_input)
+
+        return self._show_form(self.config_entry.options)
+
+    def _show_form(self, values, errors=None):
+        """Show the options form."""
+        schema = {
+            # Temperatures, humidity, capacities, alarm and operating state
+            vol.Required(
+                CONF_FAST_INTERVAL, default=values.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL)
+            ): vol.All(int, vol.Range(min=5)),
+            # Modes, fan speeds and target temperature
+            vol.Required(
+                CONF_NORMAL_INTERVAL, default=values.get(CONF_NORMAL_INTERVAL, DEFAULT_NORMAL_INTERVAL)
+            ): vol.All(int, vol.Range(min=5)),
+            # Filter days, hot water and cooling setpoints, air exchange mode
+            vol.Required(
+                CONF_SLOW_INTERVAL, default=values.get(CONF_SLOW_INTERVAL, DEFAULT_SLOW_INTERVAL)
+            ): vol.All(int, vol.Range(min=5)),
+            # Alarm and operating state between the cycles, 0 disables the fast path
+            vol.Required(
+                CONF_ALARM_INTERVAL, default=values.get(CONF_ALARM_INTERVAL, DEFAULT_ALARM_INTERVAL)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=60)),
+            # Back off while the unit is idle or stable, follow Defrost, Legionella and alarms closely
+            vol.Required(
+                CONF_ADAPTIVE_POLLING, default=values.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING)
+            ): bool,
+            # Smallest change in °C that updates a temperature
+            vol.Required(
+                CONF_TEMPERATURE_DEADBAND,
+                default=values.get(CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            # Smallest change in % that updates humidity or a capacity
+            vol.Required(
+                CONF_PERCENTAGE_DEADBAND,
+                default=values.get(CONF_PERCENTAGE_DEADBAND, DEFAULT_PERCENTAGE_DEADBAND),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            # Samples kept per channel for the statistics and dump_samples, 0 disables the buffers
+            vol.Required(
+                CONF_SAMPLE_CAPACITY, default=values.get(CONF_SAMPLE_CAPACITY, DEFAULT_SAMPLE_CAPACITY)
+            ): vol.All(int, vol.Range(min=0, max=100000)),
+            # Seconds covered by the published mean, minimum and maximum
+            vol.Required(
+                CONF_STATISTICS_WINDOW, default=values.get(CONF_STATISTICS_WINDOW, DEFAULT_STATISTICS_WINDOW)
+            ): vol.All(int, vol.Range(min=60)),
+            # Per-transaction latency and error statistics for diagnostics
+            vol.Required(
+                CONF_COLLECT_METRICS, default=values.get(CONF_COLLECT_METRICS, DEFAULT_COLLECT_METRICS)
+            ): bool,
+            # Record every transaction of the unit's port to a trace file for offline replay
+            vol.Required(CONF_TRACE, default=values.get(CONF_TRACE, DEFAULT_TRACE)): bool,
+            # Local Modbus TCP port serving the registers to other consumers, 0 disables the proxy
+            vol.Required(
+                CONF_PROXY_PORT, default=values.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT)
+            ): vol.All(int, vol.Range(min=0, max=65535)),
+            # Address the proxy listens on, 0.0.0.0 exposes it to the whole network
+            vol.Required(CONF_PROXY_HOST, default=values.get(CONF_PROXY_HOST, DEFAULT_PROXY_HOST)): str,
+            # Let consumers write the holding registers of the register map
+            vol.Required(CONF_PROXY_WRITES, default=values.get(CONF_PROXY_WRITES, DEFAULT_PROXY_WRITES)): bool,
+            # Seconds a register the integration does not poll is served from the proxy's image
+            vol.Required(
+                CONF_PROXY_MAX_AGE, default=values.get(CONF_PROXY_MAX_AGE, DEFAULT_PROXY_MAX_AGE)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        }
+        if self.config_entry.data.get(CONF_TRANSPORT) == TRANSPORT_TCP:
+            # Requests in flight at once, only Modbus TCP frames carry an id matching responses to requests
+            schema[vol.Required(
+                CONF_PIPELINE_DEPTH, default=values.get(CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH)
+            )] = vol.All(int, vol.Range(min=1, max=MAX_PIPELINE_DEPTH))
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(schema), errors=errors or {})
@@ -1,3 +1,138 @@
 # const.py
 
 DOMAIN = "nilan"
+
+# Transports
+CONF_TRANSPORT = "transport"
+CONF_HOST = "host"
+CONF_TCP_PORT = "tcp_port"
+TRANSPORT_SERIAL = "serial"
+TRANSPORT_TCP = "tcp"
+TRANSPORT_RTU_OVER_TCP = "rtu_over_tcp"
+TRANSPORTS = (TRANSPORT_SERIAL, TRANSPORT_TCP, TRANSPORT_RTU_OVER_TCP)
+DEFAULT_TCP_PORT = 502
+DEFAULT_TIMEOUT = 3  # Seconds to wait for a response, also the ceiling of the adaptive timeout
+MIN_TIMEOUT = 0.3  # Floor of the adaptive timeout, in seconds
+RECONNECT_DELAY_MAX = 5  # Cap on the reconnect back-off, in seconds
+TCP_KEEPALIVE_IDLE = 30  # Seconds of idle connection before keepalive probes start
+TCP_KEEPALIVE_INTERVAL = 10
+TCP_KEEPALIVE_COUNT = 3
+CONF_PIPELINE_DEPTH = "pipeline_depth"
+DEFAULT_PIPELINE_DEPTH = 1  # Requests in flight on a Modbus TCP connection, 1 sends one at a time
+MAX_PIPELINE_DEPTH = 16
+PIPELINE_RETRY_DELAY = 600  # Seconds before pipelining is tried again after a fallback, doubled per fallback
+PIPELINE_RETRY_DELAY_MAX = 86400
+
+# Register tables
+INPUT = "input"
+HOLDING = "holding"
+
+# Read planner options
+CONF_MAX_GAP = "max_gap"
+CONF_MAX_BLOCK = "max_block"
+DEFAULT_MAX_GAP = 10  # Unused registers allowed inside one block read
+DEFAULT_MAX_BLOCK = 125  # Largest register count a single Modbus read PDU can carry
+
+# Failure handling
+DEFAULT_RETRY_BUDGET = 2  # Failed block reads retried per cycle before the cycle is cut short
+BREAKER_FAILURE_THRESHOLD = 3  # Consecutive failed cycles before the unit is considered offline
+BREAKER_RESET_TIMEOUT = 10  # Seconds before the first probe of an offline unit, doubled per failed probe
+BREAKER_RESET_TIMEOUT_MAX = 300
+
+# Write path
+DEFAULT_WRITE_DEBOUNCE = 0.25  # Seconds writes are collected before they are sent
+MAX_WRITE_BLOCK = 121  # Largest register count a read/write multiple registers PDU can write
+
+# On-device bus calibration, stored in the config entry
+CONF_CALIBRATION = "calibration"
+CALIBRATION_LATENCY_SAMPLES = 10  # Round trips measured per function code
+CALIBRATION_RATE_GAPS = (0.1, 0.05, 0.02, 0.01, 0.0)  # Seconds between requests, from slow to fast
+CALIBRATION_RATE_BURST = 10  # Requests sent at each gap
+CALIBRATION_DEADLINE = 120  # Seconds before an unfinished calibration is given up
+CALIBRATION_TIMEOUT_FACTOR = 5  # Timeout ceiling as a multiple of the slowest measured round trip
+
+# Supported models
+CONF_MODEL = "model"
+MODEL_COMPACT_P_NORDIC = "compact_p_nordic"
+DEFAULT_MODEL = MODEL_COMPACT_P_NORDIC
+
+# Polling groups and their intervals in seconds
+GROUP_FAST = "fast"
+GROUP_NORMAL = "normal"
+GROUP_SLOW = "slow"
+GROUPS = (GROUP_FAST, GROUP_NORMAL, GROUP_SLOW)
+CONF_FAST_INTERVAL = "fast_interval"
+CONF_NORMAL_INTERVAL = "normal_interval"
+CONF_SLOW_INTERVAL = "slow_interval"
+DEFAULT_FAST_INTERVAL = 30
+DEFAULT_NORMAL_INTERVAL = 120
+DEFAULT_SLOW_INTERVAL = 900
+
+# Polling that follows the operating state and how much the values move
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+DEFAULT_ADAPTIVE_POLLING = True
+POLL_MODE_NORMAL = "normal"
+POLL_MODE_IDLE = "idle"
+POLL_SAMPLED = "sampled"  # Sampled registers read at the configured fast interval while the groups back off
+POLL_FOCUS_INTERVAL = 5  # Seconds between reads of the registers that matter in Defrost, Legionella or an alarm
+POLL_IDLE_FACTOR = 8  # Interval multiplier while the unit is off, in standby or has its ventilation stopped
+POLL_STABLE_CYCLES = 3  # Cycles without a published change before the intervals double
+POLL_STABLE_FACTOR_MAX = 4  # Largest interval multiplier reached by stable values
+POLL_MAX_INTERVAL = 900  # Seconds, no group is backed off past this or its own interval
+
+# Alarm fast path polled between the regular cycles, and the events it fires
+CONF_ALARM_INTERVAL = "alarm_interval"
+DEFAULT_ALARM_INTERVAL = 1  # Seconds, 0 disables the fast path
+EVENT_ALARM = "nilan_alarm"
+EVENT_HVAC_ACTION = "nilan_hvac_action"
+
+# Local Modbus TCP endpoint serving the register image to other consumers
+CONF_PROXY_PORT = "proxy_port"
+CONF_PROXY_HOST = "proxy_host"
+CONF_PROXY_MAX_AGE = "proxy_max_age"
+CONF_PROXY_WRITES = "proxy_writes"
+DEFAULT_PROXY_PORT = 0  # 0 disables the proxy
+DEFAULT_PROXY_HOST = "127.0.0.1"  # Loopback only, the proxy has no authentication
+DEFAULT_PROXY_MAX_AGE = 30  # Seconds a register the integration does not poll is served from the image
+DEFAULT_PROXY_WRITES = False  # Read-only unless writes to the mapped holding registers are allowed
+PROXY_FRESHNESS_FACTOR = 2  # Polled registers are served until this many of their intervals passed
+
+# Transaction and cycle metrics for diagnostics
+CONF_COLLECT_METRICS = "collect_metrics"
+DEFAULT_COLLECT_METRICS = True
+SIGNAL_METRICS_UPDATED = "nilan_metrics_updated_{}"  # Sent after every cycle, formatted with the entry ID
+
+# Opt-in bus trace, one file per port with rotation
+CONF_TRACE = "trace"
+DEFAULT_TRACE = False
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUP_COUNT = 3
+TRACE_FLUSH_INTERVAL = 10  # Seconds between writes of the buffered records
+
+# Deadbands applied to analog values before they are published
+DEADBAND_TEMPERATURE = "temperature"
+DEADBAND_PERCENTAGE = "percentage"
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
+CONF_PERCENTAGE_DEADBAND = "percentage_deadband"
+DEFAULT_TEMPERATURE_DEADBAND = 0.1  # °C
+DEFAULT_PERCENTAGE_DEADBAND = 1.0  # %
+
+# High-resolution sample buffers and their published statistics
+CONF_SAMPLE_CAPACITY = "sample_capacity"
+CONF_STATISTICS_WINDOW = "statistics_window"
+DEFAULT_SAMPLE_CAPACITY = 2880  # Samples per channel, 24 hours at the default fast interval
+DEFAULT_STATISTICS_WINDOW = 300  # Seconds, also how often the statistics are published
+
+# Figures derived from the snapshot and maintained incrementally
+EFFICIENCY_TIME_CONSTANT = 3600  # Seconds, time constant of the averaged heat recovery efficiency
+EFFICIENCY_MIN_DELTA = 5  # °C between room exhaust and intake below which the efficiency is not sampled
+DUTY_CYCLE_TIME_CONSTANT = 86400  # Seconds, time constant of the averaged compressor duty cycle
+DERIVED_MAX_GAP = 900  # Seconds, longer gaps between samples are not integrated
+DERIVED_PUBLISH_INTERVAL = 60  # Seconds between state writes of the derived sensors
+
+# Persisted snapshot restored at startup
+STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 300  # Seconds between snapshot writes, the last one is flushed at shutdown
+ATTR_STALE = "stale"
+
+PLATFORMS = ["climate", "sensor", "binary_sensor"]
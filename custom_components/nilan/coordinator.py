@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from types import MappingProxyType
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from pymodbus.exceptions import ModbusException
+
+from .const import (
+    DOMAIN,
+    EVENT_ALARM,
+    EVENT_HVAC_ACTION,
+    GROUP_FAST,
+    HOLDING,
+    SIGNAL_METRICS_UPDATED,
+    SNAPSHOT_SAVE_DELAY,
+)
+from .modbus import async_read_blocks
+from .registers import ALARM_CODE_KEYS, ALARM_STATUS, decode_alarms
+from .resilience import CircuitBreaker
+from .schedule import PollSchedule
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class NilanCoordinator(DataUpdateCoordinator):
+    """Run one consolidated bus cycle per tick and share the result.
+
+    Every register belongs to a polling group with its own interval. The
+    coordinator ticks at the fastest interval and each tick reads only the
+    groups that are due, packed into a single precompiled read plan. The
+    published data is an immutable mapping of decoded values keyed by
+    register name, so every entity reads the same snapshot and adding
+    entities never adds Modbus transactions.
+
+    Analog values only move in the snapshot once they leave their deadband,
+    and listeners are only called when the snapshot actually changed.
+
+    After repeated failed cycles a circuit breaker stops the polling and the
+    entities become unavailable. The unit is then probed with a single
+    register read until it answers and regular cycles resume.
+
+    The snapshot is persisted, so after a restart the entities start from
+    the last known values, flagged as stale until the first cycle of the
+    new run confirms them.
+
+    The raw values of the sampled registers are appended to in-memory ring
+    buffers on every cycle, from which only downsampled statistics are
+    published. Derived figures such as the heat recovery efficiency and
+    the time spent per operating state are updated from every new
+    snapshot.
+
+    The alarm registers and the operating state are also polled on their
+    own fast path between two cycles, and their changes are fired as
+    events.
+
+    With ``adaptive``, the tick and the group intervals follow the
+    operating state and how much the values move, see
+    :class:`PollSchedule`. A state change seen on the fast path moves the
+    next cycle right away.
+
+    With ``image``, the raw registers of every read and confirmed write are
+    also kept with their read time, for the Modbus TCP proxy to serve.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client,
+        slave,
+        register_map,
+        intervals,
+        deadbands=None,
+        metrics=None,
+        store=None,
+        samples=None,
+        derived=None,
+        image=None,
+        adaptive=False,
+    ):
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} slave {slave}",
+            update_interval=timedelta(seconds=intervals[GROUP_FAST]),
+            always_update=False,
+        )
+        self.client = client
+        self.slave = slave
+        self.register_map = register_map
+        self.intervals = intervals
+        self.metrics = metrics
+        self.samples = samples
+        self.derived = derived
+        self.image = image
+        self.schedule = PollSchedule(intervals, adaptive, sampled=samples is not None)
+        self.stale = False
+        self._store = store
+        self._deadbands = tuple(
+            (key, deadband)
+            for kind, deadband in (deadbands or {}).items()
+            if deadband
+            for key in register_map.deadband_keys(kind)
+        )
+        self.breaker = CircuitBreaker()
+        self._last_read = {}
+        self._fast_path_running = False
+        self._fast_path_interval = None
+
+    def _due_groups(self, now):
+        """Return the polling groups that should be read in this tick."""
+        # Allow half a tick of slack so timer jitter does not skip a group
+        slack = self.update_interval.total_seconds() / 2
+        return frozenset(
+            group
+            for group in self.intervals
+            if group not in self._last_read or now - self._last_read[group] >= self.schedule.interval(group) - slack
+        )
+
+    async def _async_update_data(self):
+        """Run one bus cycle and announce the new metrics, whatever its outcome."""
+        try:
+            return await self._async_run_cycle()
+        finally:
+            if self.metrics is not None:
+                # Metrics move on every cycle, failed or unchanged ones included, unlike the snapshot
+                async_dispatcher_send(self.hass, SIGNAL_METRICS_UPDATED.format(self.config_entry.entry_id))
+
+    async def _async_run_cycle(self):
+        """Read the registers of all due groups in one bus cycle."""
+        now = time.monotonic()
+        self.always_update = False
+        if self.breaker.is_open:
+            await self._async_probe(now)
+        due = self._due_groups(now)
+        extra = self.schedule.extra
+        if not due and extra is None:
+            # An extra refresh between two ticks has nothing to read
+            return self.data
+        metrics = self.metrics
+        try:
+            blocks = await async_read_blocks(self.client, self.slave, self.register_map.plan_for_groups(due, extra))
+        except ModbusException as e:
+            if metrics is not None:
+                metrics.record_cycle(time.monotonic() - now, False)
+            self.breaker.record_failure(now)
+            raise UpdateFailed(f"Error communicating with Nilan device: {e}") from e
+        if metrics is not None:
+            metrics.record_cycle(time.monotonic() - now, bool(blocks))
+        if not blocks:
+            self.breaker.record_failure(now)
+            raise UpdateFailed("No registers could be read from the Nilan device")
+        self.breaker.record_success()
+        for group in due:
+            self._last_read[group] = now
+        if self.image is not None:
+            self.image.update(blocks, time.monotonic())
+        values = self.register_map.decode(blocks)
+        if self.samples is not None:
+            # Raw values, before the deadbands hold them back
+            self.samples.append(values, time.time())
+        changed = True
+        if self.data is not None:
+            self._apply_deadbands(values)
+            self._fire_events(values)
+            changed = any(self.data.get(key) != value for key, value in values.items())
+            values = {**self.data, **values}
+        self.schedule.observe(values)
+        self.schedule.record_cycle(due, changed)
+        # The next cycle is scheduled from this interval once the refresh returns
+        self.update_interval = timedelta(seconds=self.schedule.tick)
+        if self.derived is not None:
+            self.derived.update(values, time.time())
+        if self.stale:
+            # The first confirmed cycle reaches every listener, even without changed values
+            self.always_update = True
+            self.stale = False
+        if self._store is not None:
+            self._store.async_delay_save(self._snapshot_to_save, SNAPSHOT_SAVE_DELAY)
+        return MappingProxyType(values)
+
+    @callback
+    def async_start_fast_path(self, interval):
+        """Poll the fast path registers every ``interval`` seconds and return the cancel callback."""
+        self._fast_path_interval = interval
+        return async_track_time_interval(
+            self.hass,
+            self._async_fast_path_tick,
+            timedelta(seconds=interval),
+            name=f"{DOMAIN} slave {self.slave} fast path",
+            cancel_on_shutdown=True,
+        )
+
+    async def _async_fast_path_tick(self, now):
+        """Read the fast path unless the focus ticks already read its registers as often."""
+        if not self.schedule.fast_path_covered(self._fast_path_interval):
+            await self._async_poll_fast_path()
+
+    async def _async_poll_fast_path(self):
+        """Read the alarm and operating state registers and publish their changes."""
+        # Never pile up requests on a busy or silent bus, the regular cycle owns the availability
+        if self._fast_path_running or self.data is None or self.breaker.is_open:
+            return
+        self._fast_path_running = True
+        try:
+            blocks = await async_read_blocks(self.client, self.slave, self.register_map.fast_path_plan, retries=0)
+        except ModbusException:
+            # Already logged, the next cycle decides whether the unit is gone
+            return
+        finally:
+            self._fast_path_running = False
+        if self.image is not None:
+            self.image.update(blocks, time.monotonic())
+        values = self.register_map.decode(blocks)
+        if all(self.data.get(key) == value for key, value in values.items()):
+            return
+        self._fire_events(values)
+        self.data = MappingProxyType({**self.data, **values})
+        if self.derived is not None:
+            # Operating state changes are timed to the second instead of the cycle
+            self.derived.update(self.data, time.time())
+        self.async_update_listeners()
+        if self.schedule.observe(self.data):
+            self._async_reschedule()
+
+    @callback
+    def _async_reschedule(self):
+        """Move the next cycle to the tick of the current polling mode."""
+        self.update_interval = timedelta(seconds=self.schedule.tick)
+        if self._listeners:
+            self._schedule_refresh()
+
+    def _fire_events(self, values):
+        """Fire an event for every alarm or operating state change against the current snapshot."""
+        previous = self.data
+        # A register seen for the first time is not a change
+        if any(
+            key in values and key in previous and values[key] != previous[key]
+            for key in (ALARM_STATUS, *ALARM_CODE_KEYS)
+        ):
+            merged = {**previous, **values}
+            self.hass.bus.async_fire(EVENT_ALARM, {
+                "entry_id": self.config_entry.entry_id,
+                "slave": self.slave,
+                "alarm_status": merged.get(ALARM_STATUS),
+                "alarms": decode_alarms(merged),
+            })
+        hvac_action = values.get("hvac_action")
+        if hvac_action is not None and "hvac_action" in previous and hvac_action != previous["hvac_action"]:
+            self.hass.bus.async_fire(EVENT_HVAC_ACTION, {
+                "entry_id": self.config_entry.entry_id,
+                "slave": self.slave,
+                "hvac_action": hvac_action,
+                "previous": previous["hvac_action"],
+            })
+
+    async def async_restore(self):
+        """Start from the snapshot persisted by the previous run, marked as stale."""
+        stored = await self._store.async_load() if self._store is not None else None
+        values = {}
+        if stored is not None and stored.get("model") == self.register_map.model:
+            values = {key: value for key, value in stored["values"].items() if key in self.register_map.registers}
+        if stored is not None and self.derived is not None and "derived" in stored:
+            self.derived.restore(stored["derived"])
+        self.data = MappingProxyType(values)
+        self.stale = True
+
+    @callback
+    def _snapshot_to_save(self):
+        """Return the current snapshot in its persisted form."""
+        snapshot = {"model": self.register_map.model, "values": dict(self.data)}
+        if self.derived is not None:
+            snapshot["derived"] = self.derived.as_dict()
+        return snapshot
+
+    async def _async_probe(self, now):
+        """Probe an unresponsive unit, raising UpdateFailed while it stays silent."""
+        # Allow half a tick of slack so the probe is not pushed to the next tick
+        if not self.breaker.probe_due(now + self.update_interval.total_seconds() / 2):
+            raise UpdateFailed("Nilan device is not responding")
+        try:
+            answered = await async_read_blocks(self.client, self.slave, (self.register_map.probe,), retries=0)
+        except ModbusException:
+            answered = None
+        if not answered:
+            self.breaker.record_failure(now)
+            raise UpdateFailed("Nilan device is not responding")
+        self.breaker.record_success()
+
+    def _apply_deadbands(self, values):
+        """Keep the published value of analog registers that moved less than their deadband."""
+        for key, deadband in self._deadbands:
+            value = values.get(key)
+            previous = self.data.get(key)
+            if value is not None and previous is not None and abs(value - previous) < deadband:
+                values[key] = previous
+
+    async def async_write_values(self, values):
+        """Write decoded values, showing them right away and confirming them from the read-back.
+
+        The snapshot takes the new values before anything is sent. Each
+        written register is read back right after the write and compared to
+        the value that went out, which is a later caller's when the bus
+        replaced this one inside its debounce window. A value the unit holds
+        differently replaces the optimistic one, and a value whose write
+        failed rolls back to the previous snapshot. Returns True when no
+        value had to be corrected or rolled back. Raises ValueError, before
+        anything is sent, for an unknown option label or a value out of the
+        register's range.
+        """
+        register_map = self.register_map
+        raw = {key: register_map.encode_value(key, value) for key, value in values.items()}
+        unknown = [key for key, value in raw.items() if value is None]
+        if unknown:
+            raise ValueError(f"Cannot encode {', '.join(f'{key}={values[key]}' for key in unknown)}")
+        previous = {key: self.data.get(key) for key in values} if self.data is not None else {}
+        self.async_set_written_values(values)
+        results = await asyncio.gather(
+            *(
+                self.client.write_register_verified(register_map.address(key), value, slave=self.slave)
+                for key, value in raw.items()
+            ),
+            return_exceptions=True,
+        )
+        confirmed = {}
+        accepted = True
+        for (key, value), result in zip(raw.items(), results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Error writing %s: %s", key, result)
+                confirmed[key] = previous.get(key)
+                accepted = False
+                continue
+            sent, read_back = result
+            if read_back is not None and read_back != sent:
+                confirmed[key] = register_map.decode_value(key, read_back)
+                _LOGGER.warning(
+                    "Nilan device kept %s at %s instead of %s", key, confirmed[key], register_map.decode_value(key, sent)
+                )
+                accepted = False
+            elif sent != value:
+                # Replaced by a later write in the same debounce window, which is what the unit holds now
+                confirmed[key] = register_map.decode_value(key, sent)
+            else:
+                # Confirmed, or written without a read-back and left to the next cycle
+                confirmed[key] = values[key]
+            if self.image is not None:
+                self.image.set(HOLDING, register_map.address(key), [sent if read_back is None else read_back], time.monotonic())
+        # A cycle that was already on the bus may have published the old values meanwhile
+        self.async_set_written_values(confirmed)
+        return accepted
+
+    @callback
+    def async_set_written_values(self, values):
+        """Merge values confirmed by a write into the current snapshot."""
+        # The unit reacts to a new setting, follow it at the configured rate
+        self.schedule.record_change()
+        if self.data is not None:
+            self.data = MappingProxyType({**self.data, **values})
+            self.async_update_listeners()
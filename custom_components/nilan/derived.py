@@ -0,0 +1,130 @@
+import math
+
+from .const import (
+    DERIVED_MAX_GAP,
+    DUTY_CYCLE_TIME_CONSTANT,
+    EFFICIENCY_MIN_DELTA,
+    EFFICIENCY_TIME_CONSTANT,
+)
+
+SECONDS_PER_DAY = 86400
+
+
+class ExponentialAverage:
+    """Time-weighted exponential moving average of an irregularly sampled value."""
+
+    __slots__ = ("time_constant", "value")
+
+    def __init__(self, time_constant, value=None):
+        """Initialize the average, empty unless a value is restored."""
+        self.time_constant = time_constant
+        self.value = value
+
+    def add(self, sample, duration):
+        """Weigh in a sample that held for ``duration`` seconds."""
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += (1 - math.exp(-duration / self.time_constant)) * (sample - self.value)
+
+
+class NilanDerived:
+    """Figures derived from the snapshot, maintained incrementally.
+
+    Every update costs O(1) whatever the history: the previous sample is
+    held until the next one, its duration is added to the running counters
+    and averages, and nothing else is kept. Gaps longer than
+    ``DERIVED_MAX_GAP`` while the unit was silent are not integrated, and
+    integration starts over after a restart. The state is small enough to
+    be persisted with the snapshot, so the figures survive restarts.
+    """
+
+    def __init__(self):
+        """Initialize empty figures."""
+        self.efficiency = ExponentialAverage(EFFICIENCY_TIME_CONSTANT)
+        self.duty_cycle = ExponentialAverage(DUTY_CYCLE_TIME_CONSTANT)
+        self.compressor_seconds = 0.0
+        self.state_seconds = {}
+        self.filter_wear_rate = None
+        self._last_time = None
+        self._last_efficiency = None
+        self._last_running = None
+        self._last_state = None
+        self._filter_anchor = None
+
+    def update(self, values, now):
+        """Account for the time since the previous update and take the new sample."""
+        if self._last_time is not None and 0 < now - self._last_time <= DERIVED_MAX_GAP:
+            duration = now - self._last_time
+            if self._last_efficiency is not None:
+                self.efficiency.add(self._last_efficiency, duration)
+            if self._last_running is not None:
+                self.duty_cycle.add(float(self._last_running), duration)
+                if self._last_running:
+                    self.compressor_seconds += duration
+            if self._last_state is not None:
+                self.state_seconds[self._last_state] = self.state_seconds.get(self._last_state, 0.0) + duration
+        self._last_time = now
+        self._last_efficiency = _efficiency(values)
+        capacity = values.get("actual_capacity")
+        self._last_running = None if capacity is None else capacity > 0
+        state = values.get("hvac_action")
+        self._last_state = None if state is None else str(state)
+        self._update_filter(values, now)
+
+    def _update_filter(self, values, now):
+        """Measure how fast the filter counters advance against the wall clock."""
+        since = values.get("days_since_filter_change")
+        remaining = values.get("days_to_filter_change")
+        if since is None or remaining is None:
+            return
+        if self._filter_anchor is None or since < self._filter_anchor[1]:
+            # First sample or the filter was changed, measure from here
+            self._filter_anchor = (now, since)
+            self.filter_wear_rate = None
+            return
+        elapsed = (now - self._filter_anchor[0]) / SECONDS_PER_DAY
+        if elapsed >= 1 and since + remaining:
+            self.filter_wear_rate = 100 * (since - self._filter_anchor[1]) / elapsed / (since + remaining)
+
+    def state_hours(self, state):
+        """Return the hours spent in an operating state."""
+        return self.state_seconds.get(state, 0.0) / 3600
+
+    def as_dict(self):
+        """Return the state in its persisted form."""
+        return {
+            "supply_efficiency": self.efficiency.value,
+            "duty_cycle": self.duty_cycle.value,
+            "compressor_seconds": self.compressor_seconds,
+            "state_seconds": dict(self.state_seconds),
+            "filter_wear_rate": self.filter_wear_rate,
+            "filter_anchor": self._filter_anchor,
+        }
+
+    def restore(self, data):
+        """Continue from a persisted state."""
+        # Averages of the earlier estimate from the room temperature are not carried over
+        self.efficiency.value = data.get("supply_efficiency")
+        self.duty_cycle.value = data.get("duty_cycle")
+        self.compressor_seconds = data.get("compressor_seconds", 0.0)
+        self.state_seconds = dict(data.get("state_seconds", {}))
+        self.filter_wear_rate = data.get("filter_wear_rate")
+        anchor = data.get("filter_anchor")
+        self._filter_anchor = tuple(anchor) if anchor is not None else None
+
+
+def _efficiency(values):
+    """Return the instantaneous heat recovery efficiency, or None when it is not meaningful.
+
+    This is the supply side temperature ratio of EN 308: how much of the
+    difference between the room exhaust and the outdoor intake the heat
+    exchanger gives to the supply air,
+    efficiency = (supply - intake) / (room exhaust - intake).
+    """
+    intake = values.get("intake_temperature")
+    exhaust = values.get("room_exhaust_temperature")
+    supply = values.get("supply_temperature")
+    if intake is None or exhaust is None or supply is None or exhaust - intake < EFFICIENCY_MIN_DELTA:
+        return None
+    return min(max((supply - intake) / (exhaust - intake), 0.0), 1.0)
@@ -0,0 +1,35 @@
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_HOST, DOMAIN
+
+TO_REDACT = {CONF_HOST}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return diagnostics for a config entry."""
+    bus = hass.data[DOMAIN][entry.entry_id]["bus"]
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    proxy = hass.data[DOMAIN][entry.entry_id]["proxy"]
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "read_plan": [block._asdict() for block in coordinator.register_map.read_plan],
+        "last_update_success": coordinator.last_update_success,
+        "stale": coordinator.stale,
+        "breaker": coordinator.breaker.as_dict(),
+        "schedule": coordinator.schedule.as_dict(),
+        "snapshot": dict(coordinator.data or {}),
+        "samples": (
+            {key: len(buffer) for key, buffer in coordinator.samples.buffers.items()}
+            if coordinator.samples is not None
+            else None
+        ),
+        "bus": bus.stats(),
+        "proxy": proxy.stats() if proxy is not None else None,
+        "derived": coordinator.derived.as_dict() if coordinator.derived is not None else None,
+        "metrics": coordinator.metrics.as_dict() if coordinator.metrics is not None else None,
+    }
@@ -0,0 +1,61 @@
+from abc import abstractmethod
+
+from homeassistant.core import callback
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import ATTR_STALE, DOMAIN
+
+
+class NilanEntity(CoordinatorEntity):
+    """Base class for entities backed by the Nilan coordinator.
+
+    State is only written when the entity's own decoded values or its
+    availability changed, so a snapshot that only moved other registers
+    does not produce a state write or a recorder row for this entity.
+
+    Values restored from the previous run carry a ``stale`` attribute until
+    the coordinator confirmed them with a fresh cycle.
+    """
+
+    def __init__(self, coordinator, key):
+        """Initialize the entity."""
+        super().__init__(coordinator)
+        self._last_available = None
+        self._last_stale = None
+        entry = coordinator.config_entry
+        # Scoped to the config entry so several units can coexist
+        self._attr_unique_id = f"{entry.entry_id}_{key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            manufacturer="Nilan",
+            model=coordinator.register_map.model,
+            name=entry.title,
+        )
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Write state if the latest snapshot changed this entity."""
+        changed = self._apply_snapshot(self.coordinator.data)
+        available = self.available
+        stale = self.coordinator.stale
+        if changed or available != self._last_available or stale != self._last_stale:
+            self._last_available = available
+            self._last_stale = stale
+            self.async_write_ha_state()
+
+    @property
+    def extra_state_attributes(self):
+        """Return the entity's attributes, flagged while they are restored values."""
+        attributes = self._state_attributes()
+        if not self.coordinator.stale:
+            return attributes
+        return {**(attributes or {}), ATTR_STALE: True}
+
+    def _state_attributes(self):
+        """Return the entity's own state attributes."""
+        return getattr(self, "_attr_extra_state_attributes", None)
+
+    @abstractmethod
+    def _apply_snapshot(self, values):
+        """Take the entity's values from a snapshot and report if they changed."""
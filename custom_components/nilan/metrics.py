@@ -0,0 +1,116 @@
+import bisect
+import time
+
+# Upper bounds of the latency histogram buckets in seconds, the last bucket is open ended
+LATENCY_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+# Modbus function codes used by the integration
+FC_READ_HOLDING = 3
+FC_READ_INPUT = 4
+FC_WRITE_MULTIPLE = 16
+FC_READ_WRITE_MULTIPLE = 23
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with running totals."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        """Add one sample."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    @property
+    def mean(self):
+        """Return the mean latency, or None without samples."""
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        """Return the histogram as a plain dict."""
+        buckets = {f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {"count": self.count, "mean": self.mean, "max": self.max, "buckets": buckets}
+
+
+class BusMetrics:
+    """Transaction and cycle statistics collected on the hot path.
+
+    The bus and coordinator only call into this class when metrics are
+    enabled, so a disabled instance costs nothing per transaction.
+    """
+
+    def __init__(self):
+        """Initialize empty statistics."""
+        self.transactions = {}
+        self.errors = 0
+        self.timeouts = 0
+        self.cycles = LatencyHistogram()
+        self.failed_cycles = 0
+        self.last_cycle_duration = None
+        self.last_success = None
+        self._last_success_monotonic = None
+
+    def record_transaction(self, function_code, address, latency):
+        """Record the latency of a completed transaction."""
+        key = (function_code, address)
+        histogram = self.transactions.get(key)
+        if histogram is None:
+            histogram = self.transactions[key] = LatencyHistogram()
+        histogram.record(latency)
+
+    def record_error(self, timeout=False):
+        """Count a failed transaction."""
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.errors += 1
+
+    def record_cycle(self, duration, success):
+        """Record the duration and outcome of a bus cycle."""
+        self.last_cycle_duration = duration
+        if success:
+            self.cycles.record(duration)
+            self.last_success = time.time()
+            self._last_success_monotonic = time.monotonic()
+        else:
+            self.failed_cycles += 1
+
+    @property
+    def seconds_since_success(self):
+        """Return the seconds since the last successful cycle."""
+        if self._last_success_monotonic is None:
+            return None
+        return time.monotonic() - self._last_success_monotonic
+
+    @property
+    def mean_latency(self):
+        """Return the mean latency over all transactions."""
+        count = sum(histogram.count for histogram in self.transactions.values())
+        total = sum(histogram.total for histogram in self.transactions.values())
+        return total / count if count else None
+
+    def as_dict(self):
+        """Return all statistics as a plain dict."""
+        return {
+            "transactions": {
+                f"fc{function_code}@{address}": histogram.as_dict()
+                for (function_code, address), histogram in sorted(self.transactions.items())
+            },
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cycles": self.cycles.as_dict(),
+            "failed_cycles": self.failed_cycles,
+            "last_cycle_duration": self.last_cycle_duration,
+            "seconds_since_success": self.seconds_since_success,
+        }
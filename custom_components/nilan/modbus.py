@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from pymodbus.exceptions import ModbusException
+
+from .const import DEFAULT_MAX_BLOCK, DEFAULT_MAX_GAP, DEFAULT_RETRY_BUDGET, HOLDING, INPUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ReadBlock(NamedTuple):
+    """A contiguous range of registers fetched with a single request."""
+
+    table: str
+    address: int
+    count: int
+
+
+def plan_reads(table, addresses, max_gap=DEFAULT_MAX_GAP, max_block=DEFAULT_MAX_BLOCK, spans=None):
+    """Merge register addresses into as few block reads as possible.
+
+    Two addresses end up in the same block when the number of unused
+    registers between them is at most ``max_gap`` and the resulting block
+    does not exceed ``max_block`` registers. With ``spans``, a list of
+    ``(first, last)`` address ranges the unit is known to read in one
+    request, two addresses are only merged inside the same span.
+    """
+    blocks = []
+    start = end = span = None
+    for address in sorted(set(addresses)):
+        if (
+            start is not None
+            and address - end - 1 <= max_gap
+            and address - start < max_block
+            and (spans is None or (span is not None and span[0] <= address <= span[1]))
+        ):
+            end = address
+            continue
+        if start is not None:
+            blocks.append(ReadBlock(table, start, end - start + 1))
+        start = end = address
+        if spans is not None:
+            span = next((candidate for candidate in spans if candidate[0] <= address <= candidate[1]), None)
+    if start is not None:
+        blocks.append(ReadBlock(table, start, end - start + 1))
+    return blocks
+
+
+def build_read_plan(
+    input_addresses, holding_addresses, max_gap=DEFAULT_MAX_GAP, max_block=DEFAULT_MAX_BLOCK, spans=None
+):
+    """Build the list of block reads covering both register tables.
+
+    ``spans`` maps a table to the address ranges it can read in one request.
+    """
+    spans = spans or {}
+    return plan_reads(INPUT, input_addresses, max_gap, max_block, spans.get(INPUT)) + plan_reads(
+        HOLDING, holding_addresses, max_gap, max_block, spans.get(HOLDING)
+    )
+
+
+async def async_scan_registers(client, slave, table, start, end, max_block=DEFAULT_MAX_BLOCK, **kwargs):
+    """Yield ``(address, values)`` for every readable run of registers in a range.
+
+    The range is walked in blocks of ``max_block`` registers. A block that
+    answers with an exception response, typically an illegal address, is
+    split in halves until the readable parts are isolated and single
+    unsupported registers are skipped. Only the block in progress is held
+    in memory. Extra keyword arguments are passed on to the reads.
+    Communication errors are raised to the caller.
+    """
+    read = client.read_input_registers if table == INPUT else client.read_holding_registers
+    for first in range(start, end + 1, max_block):
+        pending = [(first, min(max_block, end - first + 1))]
+        while pending:
+            address, count = pending.pop()
+            result = await read(address, count=count, slave=slave, **kwargs)
+            if not result.isError() and len(result.registers) >= count:
+                yield address, result.registers[:count]
+            elif count > 1:
+                half = count // 2
+                pending.append((address + half, count - half))
+                pending.append((address, half))
+
+
+async def async_read_blocks(client, slave, plan, retries=DEFAULT_RETRY_BUDGET):
+    """Execute a read plan and return the raw registers of each block keyed by block.
+
+    Blocks that fail are logged and left out of the result, so callers only
+    see registers that were actually read in this cycle. If the unit
+    answered none of the blocks, the ModbusException that ended the cycle
+    is raised instead. Any other exception is a bug or a cancellation and
+    is raised as it is.
+
+    A block that fails with a communication error is retried as long as the
+    cycle's retry budget lasts. Once the budget is spent, the next
+    communication error ends the cycle, so a unit that stopped answering
+    costs a few timeouts instead of one per block. Exception responses come
+    from a unit that did answer and are never retried.
+
+    When the client allows several transactions in flight, all blocks are
+    requested at once and the client decides how many are on the wire. The
+    retry budget is shared, and ending the cycle cancels the blocks still
+    pending. If the client fell back to one transaction at a time
+    meanwhile, the blocks that were not read are read one by one with a
+    fresh budget, so the cycle that detects a gateway unable to pipeline
+    still completes.
+    """
+    if getattr(client, "concurrency", 1) <= 1 or len(plan) <= 1:
+        return await _read_blocks_serialized(client, slave, plan, retries)
+
+    budget = [retries]
+    blocks = {}
+    tasks = {asyncio.ensure_future(_read_block(client, slave, block, budget)): block for block in plan}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+    answered = set()
+    failure = None
+    for task in done:
+        # Raises the CancelledError of a task cancelled from outside
+        error = task.exception()
+        if error is None:
+            answered.add(tasks[task])
+            if task.result() is not None:
+                blocks[tasks[task]] = task.result()
+        elif isinstance(error, ModbusException):
+            failure = error
+        else:
+            raise error
+    if len(answered) < len(plan) and getattr(client, "concurrency", 1) <= 1:
+        # Exception responses came from the unit and are not asked again
+        unread = [block for block in plan if block not in answered]
+        try:
+            blocks.update(await _read_blocks_serialized(client, slave, unread, retries))
+            failure = None
+        except ModbusException as e:
+            failure = e
+    if failure is not None and not answered:
+        raise failure
+    # Keep the plan order, which is the order a serialized cycle returns
+    return {block: blocks[block] for block in plan if block in blocks}
+
+
+async def _read_blocks_serialized(client, slave, plan, retries):
+    """Read the blocks one after the other, ending the cycle once the retry budget is spent.
+
+    Raises the ModbusException that ended the cycle if no block was answered.
+    """
+    budget = [retries]
+    blocks = {}
+    answered = False
+    for block in plan:
+        try:
+            registers = await _read_block(client, slave, block, budget)
+        except ModbusException:
+            if not answered:
+                raise
+            return blocks
+        answered = True
+        if registers is not None:
+            blocks[block] = registers
+    return blocks
+
+
+async def _read_block(client, slave, block, budget):
+    """Read one block, spending the shared retry budget, and return its registers or None.
+
+    Raises the last ModbusException once the budget is spent.
+    """
+    if block.table == INPUT:
+        read = client.read_input_registers
+    else:
+        read = client.read_holding_registers
+    while True:
+        try:
+            result = await read(block.address, count=block.count, slave=slave)
+            break
+        except ModbusException as e:
+            if budget[0] > 0:
+                budget[0] -= 1
+                _LOGGER.debug("Retrying %s registers %s-%s after: %s", block.table, block.address, block.address + block.count - 1, e)
+                continue
+            _LOGGER.error("Error reading %s registers %s-%s: %s", block.table, block.address, block.address + block.count - 1, e)
+            raise
+    if result.isError() or len(result.registers) < block.count:
+        _LOGGER.warning("Unexpected response reading %s registers %s-%s", block.table, block.address, block.address + block.count - 1)
+        return None
+    return result.registers[:block.count]
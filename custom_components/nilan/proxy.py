@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import struct
+import time
+
+from pymodbus.exceptions import ModbusException, ModbusIOException
+from pymodbus.factory import ServerDecoder
+from pymodbus.pdu import ExceptionResponse, ModbusExceptions
+from pymodbus.register_read_message import (
+    ReadHoldingRegistersResponse,
+    ReadInputRegistersResponse,
+    ReadWriteMultipleRegistersResponse,
+)
+from pymodbus.register_write_message import WriteMultipleRegistersResponse, WriteSingleRegisterResponse
+
+from .const import (
+    DEFAULT_MAX_BLOCK,
+    DEFAULT_PROXY_MAX_AGE,
+    DEFAULT_PROXY_WRITES,
+    HOLDING,
+    INPUT,
+    PROXY_FRESHNESS_FACTOR,
+)
+from .metrics import FC_READ_HOLDING, FC_READ_INPUT, FC_READ_WRITE_MULTIPLE, FC_WRITE_MULTIPLE
+from .modbus import ReadBlock
+
+_LOGGER = logging.getLogger(__name__)
+
+# Transaction id, protocol id, length of unit id and PDU, unit id
+MBAP = struct.Struct(">HHHB")
+FC_WRITE_SINGLE = 6
+_READ_TABLES = {FC_READ_INPUT: INPUT, FC_READ_HOLDING: HOLDING}
+_WRITES = (FC_WRITE_SINGLE, FC_WRITE_MULTIPLE, FC_READ_WRITE_MULTIPLE)
+_SUPPORTED = (FC_READ_HOLDING, FC_READ_INPUT, *_WRITES)
+
+
+class RegisterImage:
+    """Latest raw value of every register read from one unit, with the time it was read."""
+
+    def __init__(self):
+        """Initialize an empty image."""
+        self._tables = {INPUT: {}, HOLDING: {}}
+
+    def __len__(self):
+        """Return the number of registers held."""
+        return sum(len(table) for table in self._tables.values())
+
+    def update(self, blocks, now):
+        """Take the raw registers of block reads."""
+        for block, raw in blocks.items():
+            self.set(block.table, block.address, raw, now)
+
+    def set(self, table, address, values, now):
+        """Take the values of consecutive registers."""
+        registers = self._tables[table]
+        for offset, value in enumerate(values):
+            registers[address + offset] = (value, now)
+
+    def get(self, table, address, count, limits, default_limit, now):
+        """Return the values of consecutive registers, or None if one is missing or too old."""
+        registers = self._tables[table]
+        values = []
+        for current in range(address, address + count):
+            entry = registers.get(current)
+            if entry is None or now - entry[1] > limits.get((table, current), default_limit):
+                return None
+            values.append(entry[0])
+        return values
+
+
+class _Unit:
+    """A unit served by the proxy, with the freshness limit of each register."""
+
+    def __init__(self, coordinator, max_age):
+        """Collect the polling groups that read each register."""
+        self.coordinator = coordinator
+        self.image = coordinator.image
+        self.max_age = max_age
+        self.lock = asyncio.Lock()
+        # Only the holding registers the integration knows can be written
+        self.writable = frozenset(
+            register.address for register in coordinator.register_map.registers.values() if register.table == HOLDING
+        )
+        self._groups = {}
+        for group in coordinator.intervals:
+            for block in coordinator.register_map.plan_for_groups((group,)):
+                for address in range(block.address, block.address + block.count):
+                    self._groups.setdefault((block.table, address), []).append(group)
+        self._intervals = None
+        self._limits = {}
+
+    @property
+    def limits(self):
+        """Return the freshness limit of every polled register under the current polling intervals."""
+        schedule = self.coordinator.schedule
+        intervals = {group: schedule.interval(group) for group in self.coordinator.intervals}
+        if intervals != self._intervals:
+            # Registers polled in a group are refreshed every interval, a missed cycle is tolerated
+            self._intervals = intervals
+            self._limits = {
+                key: min(intervals[group] for group in groups) * PROXY_FRESHNESS_FACTOR
+                for key, groups in self._groups.items()
+            }
+        return self._limits
+
+
+class NilanProxy:
+    """Modbus TCP endpoint answering other consumers from the integration's register image.
+
+    Reads are answered from the image the coordinator keeps up to date, as
+    long as every requested register is within its freshness limit: twice
+    the current interval of the polling group that reads it, or ``max_age`` for a
+    register the integration does not poll. Otherwise the read is forwarded
+    to the bus at polling priority, and its result is cached for the next
+    consumer. Forwarded reads of a unit are made one at a time and the
+    image is checked again before each, so consumers asking for the same
+    stale registers cost one bus transaction.
+
+    The proxy is read-only unless ``allow_writes`` is set, and then only
+    accepts writes to the holding registers of the register map. Writes go
+    through the bus' debounced, read-back write path, and the written
+    values are merged into the snapshot, so entities follow writes made by
+    other consumers.
+
+    Units are addressed by their slave id. Requests of one connection are
+    answered in order, connections are served concurrently.
+    """
+
+    def __init__(self, host, port, max_age=DEFAULT_PROXY_MAX_AGE, allow_writes=DEFAULT_PROXY_WRITES):
+        """Initialize the proxy without listening yet."""
+        self.host = host
+        self.port = port
+        self.max_age = max_age
+        self.allow_writes = allow_writes
+        self.units = {}
+        self._server = None
+        self._connections = set()
+        self._decoder = ServerDecoder()
+        self._stats = {"requests": 0, "cache_hits": 0, "forwarded_reads": 0, "writes": 0, "errors": 0}
+
+    def add_unit(self, coordinator):
+        """Serve a unit on its slave id."""
+        if coordinator.slave in self.units:
+            raise ValueError(f"Slave {coordinator.slave} is already served on proxy port {self.port}")
+        self.units[coordinator.slave] = _Unit(coordinator, self.max_age)
+
+    def remove_unit(self, slave):
+        """Stop serving a unit."""
+        self.units.pop(slave, None)
+
+    async def async_start(self):
+        """Start listening for consumers."""
+        self._server = await asyncio.start_server(self._async_serve_connection, self.host, self.port)
+        _LOGGER.info(
+            "Serving Nilan registers on Modbus TCP %s:%s, %s",
+            self.host,
+            self.port,
+            "writes allowed" if self.allow_writes else "read-only",
+        )
+
+    async def async_stop(self):
+        """Close the listener and every consumer connection."""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in self._connections:
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    def stats(self):
+        """Return request and cache statistics."""
+        return {
+            **self._stats,
+            "connections": len(self._connections),
+            "registers": {slave: len(unit.image) for slave, unit in self.units.items()},
+        }
+
+    async def _async_serve_connection(self, reader, writer):
+        """Answer the requests of one consumer connection until it closes."""
+        self._connections.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(MBAP.size)
+                transaction_id, protocol_id, length, slave = MBAP.unpack(header)
+                if protocol_id != 0 or not 2 <= length <= 254:
+                    _LOGGER.debug("Closing proxy connection after an invalid frame")
+                    break
+                pdu = await reader.readexactly(length - 1)
+                response = await self._async_handle(slave, pdu)
+                writer.write(MBAP.pack(transaction_id, 0, len(response) + 1, slave) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _async_handle(self, slave, pdu):
+        """Answer one request PDU with a response PDU."""
+        self._stats["requests"] += 1
+        function_code = pdu[0]
+        unit = self.units.get(slave)
+        if unit is None:
+            response = ExceptionResponse(function_code, ModbusExceptions.GatewayPathUnavailable)
+        elif function_code not in _SUPPORTED or (function_code in _WRITES and not self.allow_writes):
+            response = ExceptionResponse(function_code, ModbusExceptions.IllegalFunction)
+        else:
+            try:
+                request = self._decoder.decode(pdu)
+            except (ModbusException, struct.error, ValueError):
+                request = None
+            if request is None:
+                response = ExceptionResponse(function_code, ModbusExceptions.IllegalValue)
+            else:
+                response = await self._async_execute(unit, function_code, request)
+        if response.isError():
+            self._stats["errors"] += 1
+        return bytes((response.function_code,)) + response.encode()
+
+    async def _async_execute(self, unit, function_code, request):
+        """Serve a decoded request from the image or through the bus."""
+        try:
+            if not all(1 <= count <= DEFAULT_MAX_BLOCK for count in _counts(function_code, request)):
+                raise _UnitError(ModbusExceptions.IllegalValue)
+            if function_code in _READ_TABLES:
+                table = _READ_TABLES[function_code]
+                values = await self._async_read(unit, table, request.address, request.count)
+                if table == INPUT:
+                    return ReadInputRegistersResponse(values)
+                return ReadHoldingRegistersResponse(values)
+            if function_code == FC_WRITE_SINGLE:
+                await self._async_write(unit, request.address, [request.value])
+                return WriteSingleRegisterResponse(request.address, request.value)
+            if function_code == FC_WRITE_MULTIPLE:
+                await self._async_write(unit, request.address, request.values)
+                return WriteMultipleRegistersResponse(request.address, len(request.values))
+            # Read/write multiple: the write is done before the read
+            await self._async_write(unit, request.write_address, request.write_registers)
+            values = await self._async_read(unit, HOLDING, request.read_address, request.read_count)
+            return ReadWriteMultipleRegistersResponse(values)
+        except _UnitError as e:
+            return ExceptionResponse(function_code, e.code)
+
+    async def _async_read(self, unit, table, address, count):
+        """Return fresh register values, reading them from the bus if the image is too old."""
+        values = unit.image.get(table, address, count, unit.limits, unit.max_age, time.monotonic())
+        if values is not None:
+            self._stats["cache_hits"] += 1
+            return values
+        async with unit.lock:
+            # Another consumer may have refreshed the same registers meanwhile
+            values = unit.image.get(table, address, count, unit.limits, unit.max_age, time.monotonic())
+            if values is not None:
+                self._stats["cache_hits"] += 1
+                return values
+            self._stats["forwarded_reads"] += 1
+            bus = unit.coordinator.client
+            read = bus.read_input_registers if table == INPUT else bus.read_holding_registers
+            try:
+                result = await read(address, count=count, slave=unit.coordinator.slave)
+            except ModbusException as e:
+                _LOGGER.debug("Forwarded read of %s registers %s-%s failed: %s", table, address, address + count - 1, e)
+                raise _UnitError(ModbusExceptions.GatewayNoResponse) from e
+            if result.isError():
+                # The unit's own answer, typically an illegal address
+                raise _UnitError(getattr(result, "exception_code", ModbusExceptions.SlaveFailure))
+            values = result.registers[:count]
+            unit.image.set(table, address, values, time.monotonic())
+            return values
+
+    async def _async_write(self, unit, address, values):
+        """Write registers through the bus and publish what the unit holds afterwards."""
+        if not all(address + offset in unit.writable for offset in range(len(values))):
+            raise _UnitError(ModbusExceptions.IllegalAddress)
+        self._stats["writes"] += 1
+        coordinator = unit.coordinator
+        # Queued together, so the bus sends them as one multi-register write
+        results = await asyncio.gather(
+            *(
+                coordinator.client.write_register_verified(address + offset, value, slave=coordinator.slave)
+                for offset, value in enumerate(values)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, ModbusIOException):
+                raise _UnitError(ModbusExceptions.GatewayNoResponse) from result
+            if isinstance(result, Exception):
+                raise _UnitError(ModbusExceptions.SlaveFailure) from result
+        held = [sent if read_back is None else read_back for sent, read_back in results]
+        unit.image.set(HOLDING, address, held, time.monotonic())
+        decoded = coordinator.register_map.decode({ReadBlock(HOLDING, address, len(held)): held})
+        if decoded:
+            coordinator.async_set_written_values(decoded)
+
+
+def _counts(function_code, request):
+    """Return the register counts a request asks to read or write."""
+    if function_code in _READ_TABLES:
+        return (request.count,)
+    if function_code == FC_WRITE_SINGLE:
+        return (1,)
+    if function_code == FC_WRITE_MULTIPLE:
+        return (len(request.values),)
+    return (request.read_count, len(request.write_registers))
+
+
+class _UnitError(Exception):
+    """A request that is answered with a Modbus exception code."""
+
+    def __init__(self, code):
+        """Initialize with the exception code."""
+        super().__init__(code)
+        self.code = code
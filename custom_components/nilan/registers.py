@@ -0,0 +1,392 @@
+import struct
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple, Optional
+
+from homeassistant.components.climate.const import HVACAction, HVACMode
+
+from .const import (
+    DEADBAND_PERCENTAGE,
+    DEADBAND_TEMPERATURE,
+    DEFAULT_MAX_BLOCK,
+    DEFAULT_MAX_GAP,
+    GROUP_FAST,
+    GROUP_NORMAL,
+    GROUP_SLOW,
+    GROUPS,
+    HOLDING,
+    INPUT,
+    MODEL_COMPACT_P_NORDIC,
+    POLL_MODE_IDLE,
+    POLL_MODE_NORMAL,
+    POLL_SAMPLED,
+)
+from .modbus import ReadBlock, build_read_plan
+
+
+class Register(NamedTuple):
+    """Declarative description of a single Nilan register."""
+
+    key: str
+    table: str
+    address: int
+    scale: float = 1
+    offset: float = 0
+    signed: bool = False
+    options: Optional[Mapping[int, Any]] = None
+    default: Any = None
+    group: str = GROUP_NORMAL
+    deadband: Optional[str] = None
+    sampled: bool = False
+    fast_path: bool = False
+
+
+HVAC_MODES = MappingProxyType({
+    1: HVACMode.HEAT,
+    2: HVACMode.COOL,
+    3: HVACMode.HEAT_COOL,
+})
+
+HVAC_ACTIONS = MappingProxyType({
+    0: HVACAction.OFF,
+    1: "Shifting",
+    2: "Stopping",
+    3: "Start",
+    4: "Standby",
+    5: "Ventilation stop",
+    6: HVACAction.FAN,
+    7: HVACAction.HEATING,
+    8: HVACAction.COOLING,
+    9: "Hotwater",
+    10: "Legionella",
+    11: "Cooling and Hotwater",
+    12: "Central heating",
+    13: "Defrost",
+    14: "Frost secure",
+    15: "Dervice",
+    16: "Alarm",
+    17: "Heating hotwater",
+})
+
+FAN_MODES = MappingProxyType({
+    0: "off",
+    1: "min",
+    2: "normal-low",
+    3: "normal-high",
+    4: "high",
+})
+
+AIR_EXCHANGE_MODES = MappingProxyType({
+    0: "Energy",
+    1: "Comfort",
+    2: "ComfortWater",
+})
+
+COOLING_SETPOINTS = MappingProxyType({
+    0: "Off",
+    1: "Set + 0 °C",
+    2: "Set + 1 °C",
+    3: "Set + 2 °C",
+    4: "Set + 3 °C",
+    5: "Set + 4 °C",
+    6: "Set + 5 °C",
+    7: "Set + 7 °C",
+    8: "Set + 10 °C",
+})
+
+# Alarm IDs reported in the alarm list of the CTS602 controller
+ALARM_CODES = MappingProxyType({
+    1: "Hardware error",
+    2: "Timeout",
+    3: "Fire",
+    4: "Pressure switch",
+    5: "Door open",
+    6: "Defrost",
+    7: "Frost protection",
+    8: "Frost protection outdoor",
+    9: "Overheat",
+    10: "Overpressure",
+})
+
+ALARM_STATUS = "alarm_status"
+# The alarm list holds up to three entries of ID, date and time
+ALARM_CODE_KEYS = ("alarm_1_code", "alarm_2_code", "alarm_3_code")
+
+COMPACT_P_NORDIC = (
+    # Temperature sensors report signed values, the intake goes below zero in winter
+    Register("intake_temperature", INPUT, 201, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE, sampled=True),
+    # Supply air after the heat exchanger, before any after-heating
+    Register("supply_temperature", INPUT, 202, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE),
+    Register("room_exhaust_temperature", INPUT, 204, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE, sampled=True),
+    Register("hot_water_top_temperature", INPUT, 211, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE, sampled=True),
+    Register("hot_water_bottom_temperature", INPUT, 212, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE, sampled=True),
+    Register("hot_water_anode", INPUT, 216, 0.01),
+    Register("current_humidity", INPUT, 221, 0.01, group=GROUP_FAST, deadband=DEADBAND_PERCENTAGE),
+    Register(ALARM_STATUS, INPUT, 400, group=GROUP_FAST, fast_path=True),
+    Register("alarm_1_code", INPUT, 401, group=GROUP_FAST, fast_path=True),
+    Register("alarm_2_code", INPUT, 404, group=GROUP_FAST, fast_path=True),
+    Register("alarm_3_code", INPUT, 407, group=GROUP_FAST, fast_path=True),
+    Register("hvac_action", INPUT, 1002, options=HVAC_ACTIONS, default=HVACAction.OFF, group=GROUP_FAST, fast_path=True),
+    Register("inlet_fan_speed", INPUT, 1101),
+    Register("exhaust_fan_speed", INPUT, 1102),
+    Register("days_since_filter_change", INPUT, 1103, group=GROUP_SLOW),
+    Register("days_to_filter_change", INPUT, 1104, group=GROUP_SLOW),
+    Register("current_temperature", INPUT, 1202, 0.01, signed=True, group=GROUP_FAST, deadband=DEADBAND_TEMPERATURE),
+    Register("requested_capacity", INPUT, 1205, 0.01, group=GROUP_FAST, deadband=DEADBAND_PERCENTAGE, sampled=True),
+    Register("actual_capacity", INPUT, 1206, 0.01, group=GROUP_FAST, deadband=DEADBAND_PERCENTAGE, sampled=True),
+    Register("ventilation_state", INPUT, 3102),
+    Register("hvac_mode", HOLDING, 1002, options=HVAC_MODES, default=HVACMode.OFF),
+    Register("fan_mode", HOLDING, 1003, options=FAN_MODES),
+    Register("target_temperature", HOLDING, 1004, 0.01),
+    Register("air_exch_mode", HOLDING, 1100, options=AIR_EXCHANGE_MODES, default="Unknown", group=GROUP_SLOW),
+    Register("cooling_setpoint", HOLDING, 1200, options=COOLING_SETPOINTS, default="Unknown", group=GROUP_SLOW),
+    Register("top_temperature_setpoint", HOLDING, 1700, 0.01, group=GROUP_SLOW),
+    Register("bottom_temperature_setpoint", HOLDING, 1701, 0.01, group=GROUP_SLOW),
+)
+
+MODELS = MappingProxyType({
+    MODEL_COMPACT_P_NORDIC: COMPACT_P_NORDIC,
+})
+
+# Operating states in which the unit moves neither air nor heat
+IDLE_ACTIONS = frozenset((HVACAction.OFF, "Standby", "Ventilation stop"))
+
+# Registers read every few seconds while the unit is in a transient state
+FOCUS_REGISTERS = MappingProxyType({
+    "Defrost": ("intake_temperature", "room_exhaust_temperature", "requested_capacity", "actual_capacity"),
+    "Legionella": ("hot_water_top_temperature", "hot_water_bottom_temperature", "actual_capacity"),
+    "Alarm": (
+        "intake_temperature",
+        "room_exhaust_temperature",
+        "hot_water_top_temperature",
+        "hot_water_bottom_temperature",
+        "current_temperature",
+        "requested_capacity",
+        "actual_capacity",
+    ),
+})
+
+
+def decode_alarms(values):
+    """Return the active alarms of a snapshot as codes with their descriptions."""
+    return [
+        {"code": code, "description": ALARM_CODES.get(code, f"Unknown alarm {code}")}
+        for code in (values.get(key) for key in ALARM_CODE_KEYS)
+        if code
+    ]
+
+
+def operating_mode(values):
+    """Return the polling mode of a snapshot: a focus state, idle or normal."""
+    if values.get(ALARM_STATUS):
+        return "Alarm"
+    action = values.get("hvac_action")
+    if action in FOCUS_REGISTERS:
+        return action
+    if action in IDLE_ACTIONS:
+        return POLL_MODE_IDLE
+    return POLL_MODE_NORMAL
+
+
+def _group_combinations():
+    """Return every non-empty combination of polling groups."""
+    return [
+        frozenset(group for bit, group in enumerate(GROUPS) if mask & (1 << bit))
+        for mask in range(1, 1 << len(GROUPS))
+    ]
+
+
+class _BlockDecoder:
+    """Typed decoding of one block read, compiled from the register table.
+
+    The raw registers of the block are packed once and unpacked with a
+    struct layout holding ``h`` for signed and ``H`` for unsigned registers
+    and padding for the unused ones, so every register of the block is
+    converted to its type in a single call.
+    """
+
+    __slots__ = ("_pack", "_unpack", "_fields")
+
+    def __init__(self, block, definitions):
+        """Compile the layout of the registers inside the block."""
+        inside = sorted(
+            (
+                register
+                for register in definitions
+                if register.table == block.table and block.address <= register.address < block.address + block.count
+            ),
+            key=lambda register: register.address,
+        )
+        layout = ["<"]
+        position = block.address
+        for register in inside:
+            if register.address > position:
+                layout.append(f"{2 * (register.address - position)}x")
+            layout.append("h" if register.signed else "H")
+            position = register.address + 1
+        self._pack = struct.Struct(f"<{block.count}H").pack
+        self._unpack = struct.Struct("".join(layout)).unpack_from
+        self._fields = tuple(
+            (register.key, register.scale, register.offset, register.options, register.default) for register in inside
+        )
+
+    def decode(self, raw, values):
+        """Add the decoded values of the block's registers to ``values``."""
+        for (key, scale, offset, options, default), value in zip(self._fields, self._unpack(self._pack(*raw))):
+            if options is not None:
+                values[key] = options.get(value, default)
+            elif scale != 1 or offset:
+                values[key] = value * scale + offset
+            else:
+                values[key] = value
+
+
+class RegisterMap:
+    """Register definitions of one model compiled into lookup tables."""
+
+    def __init__(self, model, max_gap=DEFAULT_MAX_GAP, max_block=DEFAULT_MAX_BLOCK, spans=None):
+        """Compile the register table of the given model.
+
+        ``spans`` maps a table to the address ranges a calibration found
+        readable in one request, which keeps block reads inside them.
+        """
+        definitions = MODELS[model]
+        self.model = model
+        self.max_gap = max_gap
+        self.max_block = max_block
+        self.spans = spans
+        self.registers = MappingProxyType({register.key: register for register in definitions})
+        self.read_plan = self.plan(self.registers)
+        # Cheapest request that proves the unit answers: one register of the first block
+        self.probe = ReadBlock(self.read_plan[0].table, self.read_plan[0].address, 1)
+        self.fast_path_plan = self.plan(register.key for register in definitions if register.fast_path)
+        self.group_plans = MappingProxyType({
+            due: self.plan(register.key for register in definitions if register.group in due)
+            for due in _group_combinations()
+        })
+        # Registers read in every tick, the focus registers of a state or the
+        # sampled ones, on their own or with the groups due in the same tick
+        fast_path_keys = tuple(register.key for register in definitions if register.fast_path)
+        # A focus cycle also covers the fast path, so it sees the state end and new alarms
+        extras = {
+            **{state: (*keys, *fast_path_keys) for state, keys in FOCUS_REGISTERS.items()},
+            POLL_SAMPLED: self.sampled_keys(),
+        }
+        self.extra_plans = MappingProxyType({
+            (extra, due): self.plan(
+                {*keys, *(register.key for register in definitions if register.group in due)}
+            )
+            for extra, keys in extras.items()
+            for due in (frozenset(), *_group_combinations())
+        })
+        self._encoders = MappingProxyType({
+            register.key: MappingProxyType({label: value for value, label in register.options.items()})
+            for register in definitions
+            if register.options is not None
+        })
+        self._definitions = definitions
+        self._block_decoders = {
+            block: _BlockDecoder(block, definitions)
+            for plan in (
+                self.read_plan,
+                (self.probe,),
+                self.fast_path_plan,
+                *self.group_plans.values(),
+                *self.extra_plans.values(),
+                # Single registers, decoded after a write
+                tuple(ReadBlock(register.table, register.address, 1) for register in definitions),
+            )
+            for block in plan
+        }
+
+    def plan_for_groups(self, groups, extra=None):
+        """Return the precompiled read plan covering the given groups and an extra register set.
+
+        ``extra`` names a focus state of ``FOCUS_REGISTERS`` or ``POLL_SAMPLED``.
+        """
+        if extra is not None:
+            return self.extra_plans[(extra, frozenset(groups))]
+        return self.group_plans[frozenset(groups)]
+
+    def decode(self, blocks):
+        """Decode the raw registers of block reads into values keyed by register name."""
+        values = {}
+        for block, raw in blocks.items():
+            decoder = self._block_decoders.get(block)
+            if decoder is None:
+                # Blocks outside the compiled plans, such as a proxy consumer's, are not kept
+                decoder = _BlockDecoder(block, self._definitions)
+            decoder.decode(raw, values)
+        return values
+
+    def plan(self, keys):
+        """Build a read plan covering only the given registers."""
+        selected = [self.registers[key] for key in keys]
+        return tuple(build_read_plan(
+            (register.address for register in selected if register.table == INPUT),
+            (register.address for register in selected if register.table == HOLDING),
+            self.max_gap,
+            self.max_block,
+            self.spans,
+        ))
+
+    def address_ranges(self):
+        """Return the mapped addresses of each table grouped by hundred, the unit's register ranges."""
+        ranges = {}
+        for register in self.registers.values():
+            ranges.setdefault((register.table, register.address // 100 * 100), []).append(register.address)
+        return {key: sorted(addresses) for key, addresses in sorted(ranges.items())}
+
+    def deadband_keys(self, kind):
+        """Return the names of the registers using the given deadband."""
+        return tuple(register.key for register in self.registers.values() if register.deadband == kind)
+
+    def sampled_keys(self):
+        """Return the names of the registers kept in the high-resolution sample buffers."""
+        return tuple(register.key for register in self.registers.values() if register.sampled)
+
+    def address(self, key):
+        """Return the address of a register."""
+        return self.registers[key].address
+
+    def encode(self, key, label):
+        """Return the raw value for an option label, or None if unknown."""
+        return self._encoders[key].get(label)
+
+    def encode_value(self, key, value):
+        """Return the raw register value of a decoded value, or None for an unknown option label.
+
+        Raises ValueError for a number the register cannot hold.
+        """
+        if key in self._encoders:
+            return self.encode(key, value)
+        return self.to_raw(key, value)
+
+    def decode_value(self, key, raw):
+        """Decode the raw value of a single register."""
+        register = self.registers[key]
+        return self.decode({ReadBlock(register.table, register.address, 1): [raw]})[key]
+
+    def to_raw(self, key, value):
+        """Convert a scaled value back to its raw register value.
+
+        Raises ValueError if the value does not fit the 16 bit register.
+        """
+        register = self.registers[key]
+        raw = int(round((value - register.offset) / register.scale))
+        low, high = (-0x8000, 0x7FFF) if register.signed else (0, 0xFFFF)
+        if not low <= raw <= high:
+            raise ValueError(
+                f"{key}={value} is outside {low * register.scale + register.offset:g}"
+                f"..{high * register.scale + register.offset:g}"
+            )
+        # Signed registers carry negative values in two's complement
+        return raw & 0xFFFF if register.signed else raw
+
+    def label(self, key, value):
+        """Return the option label for a raw value."""
+        register = self.registers[key]
+        return register.options.get(value, register.default)
+
+    def options(self, key):
+        """Return the option labels of a register in register order."""
+        return list(self.registers[key].options.values())
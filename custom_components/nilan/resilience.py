@@ -0,0 +1,181 @@
+import logging
+
+from .const import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    BREAKER_RESET_TIMEOUT_MAX,
+    DEFAULT_TIMEOUT,
+    MIN_TIMEOUT,
+    PIPELINE_RETRY_DELAY,
+    PIPELINE_RETRY_DELAY_MAX,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdaptiveTimeout:
+    """Request timeout derived from the observed round-trip times.
+
+    The estimator follows the TCP retransmission timer (RFC 6298): a
+    smoothed round-trip time plus four times its variation, clamped between
+    a floor and the configured ceiling. A timeout doubles the current value
+    until the next answered request, so a slow unit is not mistaken for a
+    dead one. A bus calibration replaces the fixed ceiling and the first
+    estimate with measured ones.
+    """
+
+    def __init__(self, minimum=MIN_TIMEOUT, maximum=DEFAULT_TIMEOUT):
+        """Start at the ceiling until the first round trip is measured."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.current = maximum
+        self.calibrated = False
+        self._srtt = None
+        self._rttvar = None
+
+    def calibrate(self, rtt, maximum):
+        """Start from a calibrated round-trip time and ceiling."""
+        if self.calibrated:
+            # Units sharing the bus keep the most patient ceiling
+            maximum = max(maximum, self.maximum)
+        self.calibrated = True
+        self.maximum = maximum
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        self.current = min(max(self._srtt + 4 * self._rttvar, self.minimum), self.maximum)
+
+    def record(self, rtt):
+        """Update the estimate with the round-trip time of an answered request."""
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self.current = min(max(self._srtt + 4 * self._rttvar, self.minimum), self.maximum)
+
+    def backoff(self):
+        """Double the timeout after a request went unanswered."""
+        self.current = min(self.current * 2, self.maximum)
+
+    def as_dict(self):
+        """Return the estimator state as a plain dict."""
+        return {
+            "current": self.current,
+            "maximum": self.maximum,
+            "calibrated": self.calibrated,
+            "srtt": self._srtt,
+            "rttvar": self._rttvar,
+        }
+
+
+class CircuitBreaker:
+    """Track consecutive failed cycles and decide when to probe the unit.
+
+    The breaker opens after a number of consecutive failed cycles. While it
+    is open the coordinator skips its cycles and only sends a single probe
+    once the reset timeout elapsed; each failed probe doubles the timeout
+    up to a maximum, and the first answered probe closes the breaker again.
+    """
+
+    def __init__(
+        self,
+        threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+        reset_timeout_max=BREAKER_RESET_TIMEOUT_MAX,
+    ):
+        """Initialize a closed breaker."""
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.reset_timeout_max = reset_timeout_max
+        self.failures = 0
+        self.retry_in = reset_timeout
+        self._opened_at = None
+
+    @property
+    def is_open(self):
+        """Return True while the unit is considered offline."""
+        return self._opened_at is not None
+
+    def probe_due(self, now):
+        """Return True once the open breaker may send a probe."""
+        return now - self._opened_at >= self.retry_in
+
+    def record_success(self):
+        """Close the breaker after an answered cycle or probe."""
+        if self.is_open:
+            _LOGGER.info("Nilan unit is responding again")
+        self.failures = 0
+        self.retry_in = self.reset_timeout
+        self._opened_at = None
+
+    def record_failure(self, now):
+        """Count a failed cycle or probe, opening the breaker at the threshold."""
+        self.failures += 1
+        if self.is_open:
+            self.retry_in = min(self.retry_in * 2, self.reset_timeout_max)
+            self._opened_at = now
+        elif self.failures >= self.threshold:
+            _LOGGER.warning(
+                "Nilan unit did not respond in %s consecutive cycles, probing it again in %s s",
+                self.failures,
+                self.retry_in,
+            )
+            self._opened_at = now
+
+    def as_dict(self):
+        """Return the breaker state as a plain dict."""
+        return {"open": self.is_open, "failures": self.failures, "retry_in": self.retry_in}
+
+
+class PipelineLimit:
+    """Number of transactions allowed in flight on a Modbus TCP link.
+
+    Modbus TCP tags every request with a transaction id, so several
+    requests can share a connection and a cycle costs about one network
+    round trip instead of one per request. Not every gateway copes: some
+    drop, answer busy or time out the requests that overlap. The first
+    failure of an overlapping request falls back to one request at a
+    time. Pipelining is tried again after a delay that doubles with every
+    further fallback, so a network hiccup costs a few serialized cycles
+    and a gateway that cannot pipeline is left alone.
+    """
+
+    def __init__(self, depth=1, retry_delay=PIPELINE_RETRY_DELAY, retry_delay_max=PIPELINE_RETRY_DELAY_MAX):
+        """Initialize the limit at the configured depth."""
+        self.depth = depth
+        self.retry_delay = retry_delay
+        self.retry_delay_max = retry_delay_max
+        self.fallbacks = 0
+        self._fallback_at = None
+
+    def current(self, now):
+        """Return the number of requests that may be in flight right now."""
+        if self._fallback_at is not None:
+            if now - self._fallback_at < self.retry_delay:
+                return 1
+            _LOGGER.info("Pipelining up to %s Modbus TCP requests again", self.depth)
+            self._fallback_at = None
+        return self.depth
+
+    def record_failure(self, now):
+        """Fall back to serialized requests after an overlapping request failed."""
+        if self._fallback_at is not None or self.depth <= 1:
+            return
+        if self.fallbacks:
+            self.retry_delay = min(self.retry_delay * 2, self.retry_delay_max)
+        self.fallbacks += 1
+        self._fallback_at = now
+        _LOGGER.warning(
+            "Modbus gateway failed overlapping requests, sending one at a time for %s s", self.retry_delay
+        )
+
+    def as_dict(self):
+        """Return the limit state as a plain dict."""
+        return {
+            "depth": self.depth,
+            "serialized": self._fallback_at is not None,
+            "fallbacks": self.fallbacks,
+            "retry_delay": self.retry_delay,
+        }
@@ -0,0 +1,161 @@
+import csv
+import io
+import struct
+import sys
+from array import array
+from collections import deque
+
+STAT_MEAN = "mean"
+STAT_MIN = "min"
+STAT_MAX = "max"
+STATS = (STAT_MEAN, STAT_MIN, STAT_MAX)
+
+
+class RollingWindow:
+    """Mean, minimum and maximum over the samples of the last ``length`` seconds.
+
+    The window keeps a running sum and two monotonic queues, so adding a
+    sample and reading the statistics are O(1) amortized, whatever the
+    number of samples inside the window.
+    """
+
+    __slots__ = ("length", "total", "count", "_start", "_minima", "_maxima")
+
+    def __init__(self, length):
+        """Initialize an empty window."""
+        self.length = length
+        self.total = 0.0
+        self.count = 0
+        self._start = 0
+        self._minima = deque()
+        self._maxima = deque()
+
+    def expire(self, buffer, before_time, before_sequence):
+        """Drop the samples older than the window or about to be overwritten."""
+        while self.count and (self._start < before_sequence or buffer.time(self._start) <= before_time):
+            self.total -= buffer.value(self._start)
+            self.count -= 1
+            if self._minima[0][0] == self._start:
+                self._minima.popleft()
+            if self._maxima[0][0] == self._start:
+                self._maxima.popleft()
+            self._start += 1
+
+    def add(self, sequence, value):
+        """Add the newest sample."""
+        if not self.count:
+            self._start = sequence
+        self.total += value
+        self.count += 1
+        while self._minima and self._minima[-1][1] >= value:
+            self._minima.pop()
+        self._minima.append((sequence, value))
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((sequence, value))
+
+    def stats(self):
+        """Return the statistics of the samples in the window, or None without samples."""
+        if not self.count:
+            return None
+        return {STAT_MEAN: self.total / self.count, STAT_MIN: self._minima[0][1], STAT_MAX: self._maxima[0][1]}
+
+
+class SampleBuffer:
+    """Fixed-size ring of timestamped samples of one channel.
+
+    Timestamps and values live in two preallocated ``array('d')`` buffers,
+    so a channel costs 16 bytes per sample and appending never allocates.
+    """
+
+    def __init__(self, capacity, windows=()):
+        """Allocate the ring and the rolling windows."""
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._next = 0
+        self.windows = {length: RollingWindow(length) for length in windows}
+
+    def __len__(self):
+        """Return the number of samples held."""
+        return min(self._next, self.capacity)
+
+    def time(self, sequence):
+        """Return the timestamp of a sample still held in the ring."""
+        return self._times[sequence % self.capacity]
+
+    def value(self, sequence):
+        """Return the value of a sample still held in the ring."""
+        return self._values[sequence % self.capacity]
+
+    def append(self, timestamp, value):
+        """Add a sample, overwriting the oldest once the ring is full."""
+        sequence = self._next
+        for window in self.windows.values():
+            window.expire(self, timestamp - window.length, sequence - self.capacity + 1)
+        index = sequence % self.capacity
+        self._times[index] = timestamp
+        self._values[index] = value
+        self._next = sequence + 1
+        for window in self.windows.values():
+            window.add(sequence, value)
+
+    def stats(self, length, now):
+        """Return the rolling statistics of a window as of ``now``."""
+        window = self.windows[length]
+        window.expire(self, now - length, self._next - self.capacity)
+        return window.stats()
+
+    def samples(self):
+        """Return the held timestamps and values, oldest first, as arrays."""
+        if self._next <= self.capacity:
+            return self._times[:self._next], self._values[:self._next]
+        start = self._next % self.capacity
+        return self._times[start:] + self._times[:start], self._values[start:] + self._values[:start]
+
+
+class NilanSamples:
+    """High-resolution sample buffers of the sampled registers of one unit."""
+
+    def __init__(self, keys, capacity, windows):
+        """Create one buffer per sampled register."""
+        self.windows = tuple(windows)
+        self.buffers = {key: SampleBuffer(capacity, self.windows) for key in keys}
+
+    def append(self, values, timestamp):
+        """Append the freshly read values of the sampled registers."""
+        for key, buffer in self.buffers.items():
+            value = values.get(key)
+            if value is not None:
+                buffer.append(timestamp, value)
+
+    def stats(self, key, length, now):
+        """Return the rolling statistics of a register over a window."""
+        return self.buffers[key].stats(length, now)
+
+    def to_csv(self):
+        """Return every held sample as CSV rows of channel, timestamp and value."""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(("channel", "timestamp", "value"))
+        for key, buffer in self.buffers.items():
+            times, values = buffer.samples()
+            writer.writerows((key, f"{timestamp:.3f}", value) for timestamp, value in zip(times, values))
+        return output.getvalue()
+
+    def to_binary(self):
+        """Return every held sample in a compact binary form.
+
+        Per channel: the name length as one byte, the UTF-8 name, the sample
+        count as a little-endian uint32, then the timestamps followed by the
+        values as little-endian float64.
+        """
+        chunks = []
+        for key, buffer in self.buffers.items():
+            times, values = buffer.samples()
+            if sys.byteorder != "little":
+                times.byteswap()
+                values.byteswap()
+            name = key.encode()
+            chunks += [struct.pack("<B", len(name)), name, struct.pack("<I", len(times)), times.tobytes(), values.tobytes()]
+        return b"".join(chunks)
@@ -0,0 +1,122 @@
+from .const import (
+    GROUP_FAST,
+    POLL_FOCUS_INTERVAL,
+    POLL_IDLE_FACTOR,
+    POLL_MAX_INTERVAL,
+    POLL_MODE_IDLE,
+    POLL_MODE_NORMAL,
+    POLL_SAMPLED,
+    POLL_STABLE_CYCLES,
+    POLL_STABLE_FACTOR_MAX,
+)
+from .registers import FOCUS_REGISTERS, operating_mode
+
+
+class PollSchedule:
+    """Polling intervals that follow the operating state and how much the values move.
+
+    The configured group intervals hold while the unit is working and its
+    values change. Every ``POLL_STABLE_CYCLES`` reads of the fast group
+    without a published change double the intervals, up to
+    ``POLL_STABLE_FACTOR_MAX``, and the first change brings them back.
+    While the unit is off, in standby or has its ventilation stopped, the
+    intervals are multiplied by ``POLL_IDLE_FACTOR`` right away.
+
+    In Defrost, Legionella or while an alarm is active, the registers of
+    the state in ``FOCUS_REGISTERS`` are read every ``POLL_FOCUS_INTERVAL``
+    and the groups keep their configured intervals.
+
+    With ``sampled``, the sample buffers keep their resolution: the tick
+    stays at the configured fast interval and, while the groups are backed
+    off, every tick reads the sampled registers on their own. Only the
+    other registers and the normal and slow groups are backed off then.
+
+    The alarm fast path keeps its configured interval. In focus it skips
+    the reads that the ticks, which read its registers too, already cover.
+
+    Without ``adaptive`` the configured intervals are used as they are.
+    """
+
+    def __init__(self, intervals, adaptive=True, sampled=False):
+        """Start from the configured intervals."""
+        self.intervals = intervals
+        self.adaptive = adaptive
+        self.sampled = sampled
+        self.mode = POLL_MODE_NORMAL
+        self.stable_cycles = 0
+
+    @property
+    def focus(self):
+        """Return the transient state whose registers are followed closely, or None."""
+        return self.mode if self.mode in FOCUS_REGISTERS else None
+
+    @property
+    def extra(self):
+        """Return the register set read in every tick besides the due groups, or None."""
+        if self.focus is not None:
+            return self.focus
+        if self.sampled and self.factor > 1:
+            return POLL_SAMPLED
+        return None
+
+    @property
+    def factor(self):
+        """Return the multiplier applied to the configured intervals."""
+        if not self.adaptive or self.focus is not None:
+            return 1
+        if self.mode == POLL_MODE_IDLE:
+            return POLL_IDLE_FACTOR
+        return min(2 ** (self.stable_cycles // POLL_STABLE_CYCLES), POLL_STABLE_FACTOR_MAX)
+
+    @property
+    def tick(self):
+        """Return the seconds between two coordinator cycles."""
+        if self.focus is not None:
+            return min(POLL_FOCUS_INTERVAL, self.intervals[GROUP_FAST])
+        if self.sampled:
+            return self.intervals[GROUP_FAST]
+        return self.interval(GROUP_FAST)
+
+    def interval(self, group):
+        """Return the current interval of a polling group."""
+        interval = self.intervals[group]
+        return min(interval * self.factor, max(interval, POLL_MAX_INTERVAL))
+
+    def fast_path_covered(self, interval):
+        """Return True if the ticks read the fast path registers at least every ``interval`` seconds."""
+        return self.focus is not None and self.tick <= interval
+
+    def observe(self, values):
+        """Follow the operating state of a snapshot, returning True if the polling mode changed."""
+        if not self.adaptive:
+            return False
+        mode = operating_mode(values)
+        if mode == self.mode:
+            return False
+        self.mode = mode
+        # Values move around a state change, start again from the configured rate
+        self.stable_cycles = 0
+        return True
+
+    def record_cycle(self, groups, changed):
+        """Count the reads of the fast group that left the snapshot unchanged."""
+        if changed:
+            self.stable_cycles = 0
+        elif GROUP_FAST in groups:
+            self.stable_cycles += 1
+
+    def record_change(self):
+        """Return to the configured rate after a value was changed from outside the cycle."""
+        self.stable_cycles = 0
+
+    def as_dict(self):
+        """Return the schedule state as a plain dict."""
+        return {
+            "adaptive": self.adaptive,
+            "mode": self.mode,
+            "extra": self.extra,
+            "factor": self.factor,
+            "stable_cycles": self.stable_cycles,
+            "tick": self.tick,
+            "intervals": {group: self.interval(group) for group in self.intervals},
+        }
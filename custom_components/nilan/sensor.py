@@ -0,0 +1,379 @@
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, PERCENTAGE, UnitOfTemperature, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .const import DERIVED_PUBLISH_INTERVAL, DOMAIN, SIGNAL_METRICS_UPDATED
+from .entity import NilanEntity
+from .registers import HVAC_ACTIONS
+from .samples import STAT_MEAN, STATS
+
+
+def _temperature(key, name):
+    """Describe a temperature sensor."""
+    return SensorEntityDescription(
+        key=key,
+        name=name,
+        native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+        device_class=SensorDeviceClass.TEMPERATURE,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=1,
+    )
+
+
+def _percentage(key, name, device_class=None):
+    """Describe a percentage sensor."""
+    return SensorEntityDescription(
+        key=key,
+        name=name,
+        native_unit_of_measurement=PERCENTAGE,
+        device_class=device_class,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=0,
+    )
+
+
+def _days(key, name):
+    """Describe a filter day counter."""
+    return SensorEntityDescription(
+        key=key,
+        name=name,
+        native_unit_of_measurement=UnitOfTime.DAYS,
+        device_class=SensorDeviceClass.DURATION,
+    )
+
+
+SENSOR_DESCRIPTIONS = (
+    _temperature("current_temperature", "Room temperature"),
+    _temperature("intake_temperature", "Intake temperature"),
+    _temperature("supply_temperature", "Supply temperature"),
+    _temperature("room_exhaust_temperature", "Room exhaust temperature"),
+    _temperature("hot_water_top_temperature", "Hot water top temperature"),
+    _temperature("hot_water_bottom_temperature", "Hot water bottom temperature"),
+    _percentage("current_humidity", "Humidity", SensorDeviceClass.HUMIDITY),
+    _percentage("requested_capacity", "Requested capacity"),
+    _percentage("actual_capacity", "Actual capacity"),
+    SensorEntityDescription(key="inlet_fan_speed", name="Inlet fan speed", state_class=SensorStateClass.MEASUREMENT),
+    SensorEntityDescription(key="exhaust_fan_speed", name="Exhaust fan speed", state_class=SensorStateClass.MEASUREMENT),
+    _days("days_since_filter_change", "Days since filter change"),
+    _days("days_to_filter_change", "Days to filter change"),
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class NilanMetricSensorEntityDescription(SensorEntityDescription):
+    """Describe a diagnostic sensor derived from the unit's bus metrics."""
+
+    value_fn: Callable[[Any], Any]
+
+
+METRIC_SENSOR_DESCRIPTIONS = (
+    NilanMetricSensorEntityDescription(
+        key="cycle_duration",
+        name="Bus cycle duration",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=3,
+        value_fn=lambda metrics: metrics.last_cycle_duration,
+    ),
+    NilanMetricSensorEntityDescription(
+        key="last_successful_cycle",
+        name="Last successful bus cycle",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda metrics: (
+            dt_util.utc_from_timestamp(metrics.last_success) if metrics.last_success is not None else None
+        ),
+    ),
+    NilanMetricSensorEntityDescription(
+        key="transaction_latency",
+        name="Mean transaction latency",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=1,
+        value_fn=lambda metrics: metrics.mean_latency * 1000 if metrics.mean_latency is not None else None,
+    ),
+    NilanMetricSensorEntityDescription(
+        key="transaction_errors",
+        name="Bus errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.errors,
+    ),
+    NilanMetricSensorEntityDescription(
+        key="transaction_timeouts",
+        name="Bus timeouts",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.timeouts,
+    ),
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class NilanDerivedSensorEntityDescription(SensorEntityDescription):
+    """Describe a sensor computed from the coordinator's derived figures."""
+
+    value_fn: Callable[[Any], Any]
+
+
+def _state_hours(key, name, state):
+    """Describe the running total of hours spent in an operating state."""
+    return NilanDerivedSensorEntityDescription(
+        key=key,
+        name=name,
+        native_unit_of_measurement=UnitOfTime.HOURS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=1,
+        value_fn=lambda derived: round(derived.state_hours(state), 2),
+    )
+
+
+DERIVED_SENSOR_DESCRIPTIONS = (
+    NilanDerivedSensorEntityDescription(
+        key="heat_recovery_efficiency",
+        name="Heat recovery efficiency",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=0,
+        value_fn=lambda derived: (
+            round(derived.efficiency.value * 100, 1) if derived.efficiency.value is not None else None
+        ),
+    ),
+    NilanDerivedSensorEntityDescription(
+        key="compressor_duty_cycle",
+        name="Compressor duty cycle",
+        native_unit_of_measurement=PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=0,
+        value_fn=lambda derived: (
+            round(derived.duty_cycle.value * 100, 1) if derived.duty_cycle.value is not None else None
+        ),
+    ),
+    NilanDerivedSensorEntityDescription(
+        key="compressor_running_time",
+        name="Compressor running time",
+        native_unit_of_measurement=UnitOfTime.HOURS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        suggested_display_precision=1,
+        value_fn=lambda derived: round(derived.compressor_seconds / 3600, 2),
+    ),
+    _state_hours("defrost_time", "Defrost time", HVAC_ACTIONS[13]),
+    _state_hours("legionella_time", "Legionella time", HVAC_ACTIONS[10]),
+    NilanDerivedSensorEntityDescription(
+        key="filter_wear_rate",
+        name="Filter wear rate",
+        native_unit_of_measurement=f"{PERCENTAGE}/{UnitOfTime.DAYS}",
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=2,
+        value_fn=lambda derived: (
+            round(derived.filter_wear_rate, 3) if derived.filter_wear_rate is not None else None
+        ),
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback
+):
+    """Set up Nilan sensors from a config entry."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinator"]
+    entities = [
+        NilanSensor(coordinator, description)
+        for description in SENSOR_DESCRIPTIONS
+        if description.key in coordinator.register_map.registers
+    ]
+    samples = coordinator.samples
+    if samples is not None:
+        descriptions = {description.key: description for description in SENSOR_DESCRIPTIONS}
+        entities.extend(
+            NilanStatisticSensor(coordinator, descriptions[key], stat, window)
+            for key in samples.buffers
+            for window in samples.windows
+            for stat in STATS
+        )
+    if coordinator.derived is not None:
+        entities.extend(NilanDerivedSensor(coordinator, description) for description in DERIVED_SENSOR_DESCRIPTIONS)
+    metrics = coordinator.metrics
+    if metrics is not None:
+        entities.extend(
+            NilanMetricSensor(coordinator, metrics, description) for description in METRIC_SENSOR_DESCRIPTIONS
+        )
+    async_add_entities(entities)
+
+
+class NilanSensor(NilanEntity, SensorEntity):
+    """A single decoded value from the coordinator snapshot."""
+
+    def __init__(self, coordinator, description: SensorEntityDescription):
+        """Initialize the sensor."""
+        super().__init__(coordinator, description.key)
+        self.entity_description = description
+        self._attr_name = f"Nilan {description.name}"
+        self._attr_native_value = coordinator.data.get(description.key)
+
+    def _apply_snapshot(self, values):
+        """Take the sensor value from the snapshot."""
+        value = values.get(self.entity_description.key)
+        if value == self._attr_native_value:
+            return False
+        self._attr_native_value = value
+        return True
+
+
+class NilanStatisticSensor(NilanEntity, SensorEntity):
+    """Rolling statistic of a sampled register, published once per window.
+
+    The samples themselves stay in the coordinator's ring buffers, only
+    one downsampled value per window reaches the state machine. The value
+    is published on a timer, since a register that stays inside its
+    deadband never changes the snapshot while its samples keep coming in.
+    """
+
+    def __init__(self, coordinator, description: SensorEntityDescription, stat, window):
+        """Initialize the sensor."""
+        key = f"{description.key}_{stat}_{window}"
+        super().__init__(coordinator, key)
+        self.entity_description = replace(
+            description,
+            key=key,
+            name=f"{description.name} {stat} {window // 60} min",
+            entity_registry_enabled_default=stat == STAT_MEAN,
+        )
+        self._attr_name = f"Nilan {self.entity_description.name}"
+        self._channel = description.key
+        self._stat = stat
+        self._window = window
+        self._attr_native_value = None
+
+    async def async_added_to_hass(self):
+        """Publish the statistic once per window."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass,
+                self._async_publish,
+                timedelta(seconds=self._window),
+                name=f"{DOMAIN} {self.entity_id} statistic",
+                cancel_on_shutdown=True,
+            )
+        )
+
+    @callback
+    def _async_publish(self, now=None):
+        """Write state if the statistic over the last window changed."""
+        stats = self.coordinator.samples.stats(self._channel, self._window, time.time())
+        value = None if stats is None else stats[self._stat]
+        if value != self._attr_native_value:
+            self._attr_native_value = value
+            self.async_write_ha_state()
+
+    def _apply_snapshot(self, values):
+        """Publishing follows the window timer, the snapshot is not used."""
+        return False
+
+
+class NilanDerivedSensor(NilanEntity, SensorEntity):
+    """A figure derived from the snapshots.
+
+    Running times keep growing while the snapshot stays the same, so the
+    figure is also published every ``DERIVED_PUBLISH_INTERVAL`` seconds and
+    not only when a coordinator listener fires.
+    """
+
+    def __init__(self, coordinator, description: NilanDerivedSensorEntityDescription):
+        """Initialize the sensor."""
+        super().__init__(coordinator, description.key)
+        self.entity_description = description
+        self._attr_name = f"Nilan {description.name}"
+        self._attr_native_value = description.value_fn(coordinator.derived)
+
+    async def async_added_to_hass(self):
+        """Publish the figure on a timer as well."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass,
+                self._async_publish,
+                timedelta(seconds=DERIVED_PUBLISH_INTERVAL),
+                name=f"{DOMAIN} {self.entity_id} derived figure",
+                cancel_on_shutdown=True,
+            )
+        )
+
+    @callback
+    def _async_publish(self, now=None):
+        """Write state if the figure changed since it was last published."""
+        if self._apply_snapshot(self.coordinator.data):
+            self.async_write_ha_state()
+
+    def _apply_snapshot(self, values):
+        """Take the current value from the derived figures, the snapshot is not used."""
+        value = self.entity_description.value_fn(self.coordinator.derived)
+        if value == self._attr_native_value:
+            return False
+        self._attr_native_value = value
+        return True
+
+
+class NilanMetricSensor(NilanEntity, SensorEntity):
+    """A bus statistic, refreshed after every coordinator cycle.
+
+    The coordinator only calls its listeners when the snapshot changed, so
+    the metrics are pushed on their own signal after every cycle and keep
+    counting while the values are stable or the unit does not answer.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, coordinator, metrics, description: NilanMetricSensorEntityDescription):
+        """Initialize the sensor."""
+        super().__init__(coordinator, description.key)
+        self.entity_description = description
+        self._metrics = metrics
+        self._attr_name = f"Nilan {description.name}"
+        self._attr_native_value = description.value_fn(metrics)
+
+    async def async_added_to_hass(self):
+        """Follow the metrics signal of the coordinator."""
+        await super().async_added_to_hass()
+        signal = SIGNAL_METRICS_UPDATED.format(self.coordinator.config_entry.entry_id)
+        self.async_on_remove(async_dispatcher_connect(self.hass, signal, self._handle_metrics_update))
+
+    @callback
+    def _handle_metrics_update(self):
+        """Write state if the cycle changed this statistic."""
+        if self._apply_snapshot(self.coordinator.data):
+            self.async_write_ha_state()
+
+    @property
+    def available(self):
+        """Stay available while the bus is failing, that is what these sensors report."""
+        return True
+
+    def _apply_snapshot(self, values):
+        """Take the current value from the metrics, the snapshot is not used."""
+        value = self.entity_description.value_fn(self._metrics)
+        if value == self._attr_native_value:
+            return False
+        self._attr_native_value = value
+        return True
@@ -0,0 +1,256 @@
+import asyncio
+import os
+import struct
+import time
+import types
+from collections import defaultdict, deque
+
+from pymodbus.exceptions import ConnectionException, ModbusException, ModbusIOException
+from pymodbus.factory import ClientDecoder
+from pymodbus.register_read_message import (
+    ReadHoldingRegistersRequest,
+    ReadInputRegistersRequest,
+    ReadWriteMultipleRegistersRequest,
+)
+from pymodbus.register_write_message import WriteMultipleRegistersRequest, WriteSingleRegisterRequest
+
+from .const import DEFAULT_TIMEOUT, TRACE_BACKUP_COUNT, TRACE_MAX_BYTES
+
+# File header, followed by the records
+TRACE_MAGIC = b"NILANTRC\x01"
+# Wall clock time, latency, slave, outcome, request length, response length
+RECORD = struct.Struct("<dfBBHH")
+
+TRACE_OK = 0
+TRACE_TIMEOUT = 1
+TRACE_ERROR = 2
+
+
+class TraceRecorder:
+    """Append-only binary trace of Modbus transactions with size based rotation.
+
+    Each record holds the request and response PDUs, function code
+    included, with the time the request was sent and its round trip.
+    Records are buffered in memory by :meth:`record`, which is safe to call
+    from the event loop, and written to disk by :meth:`flush`, which blocks
+    and belongs in the executor. Once the file reaches ``max_bytes`` it is
+    renamed to ``<path>.1``, older files are shifted and the oldest beyond
+    ``backup_count`` is dropped.
+    """
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backup_count=TRACE_BACKUP_COUNT):
+        """Initialize the recorder without touching the disk."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = []
+
+    def record(self, timestamp, latency, slave, outcome, request, response=b""):
+        """Buffer one transaction."""
+        self._buffer.append(RECORD.pack(timestamp, latency, slave, outcome, len(request), len(response)))
+        self._buffer.append(request)
+        self._buffer.append(response)
+
+    def flush(self):
+        """Write the buffered records to the trace file, rotating it when full."""
+        if not self._buffer:
+            return
+        chunk, self._buffer = b"".join(self._buffer), []
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(chunk) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "ab") as file:
+            if file.tell() == 0:
+                file.write(TRACE_MAGIC)
+            file.write(chunk)
+
+    def _rotate(self):
+        """Shift the trace file and its backups by one."""
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def read_trace(path):
+    """Yield ``(timestamp, latency, slave, outcome, request, response)`` from a trace file."""
+    with open(path, "rb") as file:
+        if file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a Nilan bus trace")
+        while header := file.read(RECORD.size):
+            if len(header) < RECORD.size:
+                break  # Truncated by a crash during the last flush
+            timestamp, latency, slave, outcome, request_length, response_length = RECORD.unpack(header)
+            request = file.read(request_length)
+            response = file.read(response_length)
+            yield timestamp, latency, slave, outcome, request, response
+
+
+def _pdu(message):
+    """Return the PDU of a request or response, function code included."""
+    return bytes((message.function_code,)) + message.encode()
+
+
+class TracingClient:
+    """Pymodbus client wrapper recording every transaction to a trace.
+
+    It offers the client methods used by the bus and forwards everything
+    else, so it can be placed between the bus and the real client.
+    """
+
+    def __init__(self, client, recorder):
+        """Wrap a pymodbus client."""
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        """Forward connection handling and parameters to the wrapped client."""
+        return getattr(self.client, name)
+
+    @property
+    def connected(self):
+        """Return True while the wrapped client is connected."""
+        return self.client.connected
+
+    async def _execute(self, request):
+        """Send a request through the wrapped client and record the exchange."""
+        timestamp = time.time()
+        start = time.monotonic()
+        try:
+            response = await self.client.execute(request)
+        except ModbusIOException:
+            self.recorder.record(timestamp, time.monotonic() - start, request.slave_id, TRACE_TIMEOUT, _pdu(request))
+            raise
+        except ModbusException:
+            self.recorder.record(timestamp, time.monotonic() - start, request.slave_id, TRACE_ERROR, _pdu(request))
+            raise
+        self.recorder.record(
+            timestamp, time.monotonic() - start, request.slave_id, TRACE_OK, _pdu(request), _pdu(response)
+        )
+        return response
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        return await self._execute(ReadInputRegistersRequest(address, count, slave))
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        return await self._execute(ReadHoldingRegistersRequest(address, count, slave))
+
+    async def write_registers(self, address, values, slave=0):
+        """Write holding registers."""
+        return await self._execute(WriteMultipleRegistersRequest(address, values, slave))
+
+    async def write_register(self, address, value, slave=0):
+        """Write a single holding register."""
+        return await self._execute(WriteSingleRegisterRequest(address, value, slave))
+
+    async def readwrite_registers(self, read_address, read_count, write_address, values, slave=0):
+        """Write holding registers and read registers back in one transaction."""
+        return await self._execute(ReadWriteMultipleRegistersRequest(
+            read_address=read_address,
+            read_count=read_count,
+            write_address=write_address,
+            write_registers=values,
+            slave=slave,
+        ))
+
+
+class ReplayClient:
+    """Stand-in for a pymodbus client that answers from a recorded trace.
+
+    Each request is answered with the next recorded response to the same
+    request of the same slave, after the recorded round trip divided by
+    ``speed``. Once every recorded response to a request was served, the
+    last one is repeated, so registers polled less often keep answering. Recorded
+    timeouts and errors are raised again, as is a timeout for a request
+    that is not in the trace at all. The round trip is still cut at the
+    timeout the caller set in ``comm_params``, so the replay follows the
+    adaptive timeout like the real bus.
+    """
+
+    def __init__(self, records, speed=1.0):
+        """Index the recorded transactions by request."""
+        self.speed = speed
+        self.comm_params = types.SimpleNamespace(timeout_connect=DEFAULT_TIMEOUT)
+        self.connected = False
+        self.unanswered = 0
+        self._decoder = ClientDecoder()
+        self._answers = defaultdict(deque)
+        self._last = {}
+        for _, latency, slave, outcome, request, response in records:
+            self._answers[(slave, request)].append((latency, outcome, response))
+
+    @classmethod
+    def from_file(cls, path, speed=1.0):
+        """Create a replay client from a trace file."""
+        return cls(read_trace(path), speed)
+
+    @property
+    def exhausted(self):
+        """Return True once every recorded response was served at least once."""
+        return not any(self._answers.values())
+
+    async def connect(self):
+        """Mark the client as connected."""
+        self.connected = True
+        return True
+
+    def close(self):
+        """Mark the client as disconnected."""
+        self.connected = False
+
+    async def _execute(self, request):
+        """Answer a request from the trace."""
+        if not self.connected:
+            raise ConnectionException("Replay client is not connected")
+        key = (request.slave_id, _pdu(request))
+        answers = self._answers.get(key)
+        if answers is None:
+            self.unanswered += 1
+            await asyncio.sleep(self.comm_params.timeout_connect / self.speed)
+            raise ModbusIOException("No recorded response left for this request")
+        if answers:
+            self._last[key] = answers.popleft()
+        latency, outcome, response = self._last[key]
+        timeout = self.comm_params.timeout_connect
+        await asyncio.sleep(min(latency, timeout) / self.speed)
+        if outcome == TRACE_TIMEOUT or latency > timeout:
+            # Pymodbus drops the connection after a timeout
+            self.connected = False
+            raise ModbusIOException("Recorded request timed out")
+        if outcome == TRACE_ERROR:
+            raise ModbusException("Recorded request failed")
+        response = self._decoder.decode(response)
+        response.slave_id = request.slave_id
+        return response
+
+    async def read_input_registers(self, address, count=1, slave=0):
+        """Read input registers."""
+        return await self._execute(ReadInputRegistersRequest(address, count, slave))
+
+    async def read_holding_registers(self, address, count=1, slave=0):
+        """Read holding registers."""
+        return await self._execute(ReadHoldingRegistersRequest(address, count, slave))
+
+    async def write_registers(self, address, values, slave=0):
+        """Write holding registers."""
+        return await self._execute(WriteMultipleRegistersRequest(address, values, slave))
+
+    async def write_register(self, address, value, slave=0):
+        """Write a single holding register."""
+        return await self._execute(WriteSingleRegisterRequest(address, value, slave))
+
+    async def readwrite_registers(self, read_address, read_count, write_address, values, slave=0):
+        """Write holding registers and read registers back in one transaction."""
+        return await self._execute(ReadWriteMultipleRegistersRequest(
+            read_address=read_address,
+            read_count=read_count,
+            write_address=write_address,
+            write_registers=values,
+            slave=slave,
+        ))